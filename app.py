@@ -4,9 +4,20 @@ from utils.auth import (
     authenticate_user, create_user, has_permission,
     Permission, UserRole, initialize_super_admin, approve_user, manage_user_tabs
 )
-from utils.company_data import get_tab_data, generate_sample_company_data
+from utils.company_data import generate_sample_company_data
+from utils.archive import load_tab_frame
+from utils.export import EXPORT_FORMATS, EXPORT_PART_BYTES, export_jobs
+from utils.access_index import access_index
+from utils.activity import log_activity
+from utils.login_buffer import login_buffer
+from utils.metric_stats import get_metric_flags, metric_stats_refresher, update_metric_stats, ROLLING_WINDOW
 from utils.models import init_db, get_db, User, Tab, SessionLocal
 import os
+from datetime import datetime, timedelta
+
+# Dashboard periods in days; the default keeps the main read path to a few partitions
+DASHBOARD_PERIODS = [30, 90, 365]
+DEFAULT_DASHBOARD_DAYS = 90
 
 # Initialize session state
 if 'authenticated' not in st.session_state:
@@ -18,8 +29,9 @@ if 'role' not in st.session_state:
 if 'user_id' not in st.session_state:
     st.session_state.user_id = None
 
-# Initialize database and create root user
-try:
+# Initialize database and create root user once per process, not on every rerun
+@st.cache_resource(show_spinner=False)
+def initialize_app():
     print("Initializing database...")
     init_db()
     print("Database initialized successfully")
@@ -29,6 +41,15 @@ try:
     print("Generating sample data...")
     generate_sample_company_data()
     print("Sample data generated successfully")
+    print("Updating metric statistics...")
+    update_metric_stats()
+    # Keep folding points written later, e.g. by backfills, into the anomaly flags
+    metric_stats_refresher.start()
+    print("Metric statistics updated successfully")
+    return True
+
+try:
+    initialize_app()
 except Exception as e:
     print(f"Error during initialization: {str(e)}")
     st.error("Error initializing application. Please check the logs.")
@@ -64,6 +85,40 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Polls the background export job every few seconds without rerunning the whole page
+@st.fragment(run_every=2)
+def show_export_status(username):
+    job = export_jobs.status(st.session_state.get('export_job'), username)
+    if job is None:
+        return
+    if job['state'] == 'running':
+        st.info(f"Preparing {job['tab_name']} export...")
+        return
+    if job['state'] == 'failed':
+        st.error(job['message'])
+        return
+
+    filenames = job['filenames']
+    ext = EXPORT_FORMATS[job['fmt']]
+    st.success(f"Exported {job['count']:,} rows")
+    if len(filenames) > 1:
+        if job['fmt'] == 'csv':
+            how = ("Only part 1 has the header row; join the parts in order, e.g. "
+                   f"`cat {job['tab_name']}-part*.csv > {job['tab_name']}.csv`.")
+        else:
+            how = "Each part is a complete Parquet file; read them together as one dataset."
+        st.info(f"The export is split into {len(filenames)} parts of up to "
+                f"{EXPORT_PART_BYTES // (1024 * 1024)} MB each. {how}")
+    links = [
+        f'<a href="app/static/exports/{filename}" '
+        f'download="{job["tab_name"]}-part{i:03d}{ext}">Download part {i}</a>'
+        if len(filenames) > 1 else
+        f'<a href="app/static/exports/{filename}" '
+        f'download="{job["tab_name"]}{ext}">Download export</a>'
+        for i, filename in enumerate(filenames, start=1)
+    ]
+    st.markdown("<br>".join(links), unsafe_allow_html=True)
+
 def main():
     st.title("Company Management System")
 
@@ -139,7 +194,9 @@ def main():
                     with col2:
                         st.write("**Email:**", user.email)
                         st.write("**Role:**", user.role_name)
-                        st.write("**Last Login:**", user.last_login.strftime("%Y-%m-%d %H:%M:%S") if user.last_login else "Never")
+                        # Prefer a login timestamp that has not been flushed yet
+                        last_login = login_buffer.pending(user.id) or user.last_login
+                        st.write("**Last Login:**", last_login.strftime("%Y-%m-%d %H:%M:%S") if last_login else "Never")
                     st.markdown('</div>', unsafe_allow_html=True)
 
                 # Super Admin Controls
@@ -188,6 +245,16 @@ def main():
                                 else:
                                     st.error(message)
 
+                        st.subheader("Access Overview")
+                        tab_matrix = access_index.tab_matrix()
+                        st.dataframe(pd.DataFrame({
+                            'Tab': list(tab_matrix),
+                            'Users': [len(usernames) for usernames in tab_matrix.values()]
+                        }), hide_index=True)
+                        overview_tab = st.selectbox("Users with access to", list(tab_matrix), key="overview_tab")
+                        if overview_tab:
+                            st.write(", ".join(tab_matrix[overview_tab]) or "No users")
+
                 # Logout button
                 if st.sidebar.button("Logout"):
                     st.session_state.authenticated = False
@@ -206,36 +273,62 @@ def main():
                         format_func=lambda x: x.replace('_', ' ').title()
                     )
 
+                    # A bounded range lets Postgres prune partitions outside it
+                    period_days = st.selectbox(
+                        "Period",
+                        DASHBOARD_PERIODS,
+                        index=DASHBOARD_PERIODS.index(DEFAULT_DASHBOARD_DAYS),
+                        format_func=lambda days: f"Last {days} days"
+                    )
+
                     if selected_tab:
-                        data, message = get_tab_data(user.username, selected_tab)
-
-                        if data:
-                            # Group data by metric name
-                            metrics = {}
-                            for record in data:
-                                if record.metric_name not in metrics:
-                                    metrics[record.metric_name] = []
-                                metrics[record.metric_name].append({
-                                    'date': record.date,
-                                    'value': record.value
-                                })
-
-                            # Display metrics
-                            for metric_name, values in metrics.items():
+                        data, message = load_tab_frame(
+                            user.username,
+                            selected_tab,
+                            start_date=datetime.utcnow() - timedelta(days=period_days)
+                        )
+
+                        # Log a view when the dashboard changes, not on every rerun
+                        if data is not None and st.session_state.get('viewed_tab') != selected_tab:
+                            st.session_state.viewed_tab = selected_tab
+                            log_activity(user.username, "view_tab", target=selected_tab)
+
+                        if data is not None and not data.empty:
+                            flags = get_metric_flags(selected_tab)
+
+                            # Display metrics, rows are ordered newest first
+                            for metric_name, df in data.groupby('metric_name', sort=False):
                                 st.subheader(metric_name)
-                                df = pd.DataFrame(values)
 
                                 # Display latest value
-                                latest_value = values[0]['value']
+                                latest_value = df['value'].iloc[0]
                                 st.metric(
                                     label="Current Value",
                                     value=f"{latest_value:,.2f}"
                                 )
 
+                                flag = flags.get(metric_name)
+                                if flag and flag['is_anomaly']:
+                                    st.warning(
+                                        f"Anomaly: latest value is {flag['z_score']:+.1f} standard deviations "
+                                        f"from the {ROLLING_WINDOW}-point rolling mean ({flag['mean']:,.2f})"
+                                    )
+
                                 # Display chart
                                 st.line_chart(df.set_index('date')['value'])
                         else:
                             st.error(message)
+
+                        # Export runs in the background and streams to disk; the files are
+                        # served by Streamlit's static handler
+                        with st.expander("Export Data"):
+                            export_format = st.selectbox("Format", list(EXPORT_FORMATS), key="export_format")
+                            if st.button("Prepare Export", key="export_button"):
+                                st.session_state.export_job = export_jobs.submit(
+                                    user.username, selected_tab, export_format
+                                )
+                            if st.session_state.get('export_job'):
+                                show_export_status(user.username)
                 else:
                     st.warning("No dashboard access. Please contact the administrator.")
             else:
@@ -0,0 +1,410 @@
+"""Concurrent-session load test for the Streamlit app.
+
+Starts one `streamlit run app.py` server against the database in DATABASE_URL
+and drives N concurrent headless clients over its websocket, speaking the same
+protocol as the browser:
+
+    DATABASE_URL=sqlite:///loadtest.db python loadtest.py --sessions 50 --iterations 3
+
+The first session initializes the database (init_db wipes it), then the
+harness seeds users and the measured sessions start. Viewer sessions log in
+and switch between dashboard tabs. Admin sessions log in as root, approve
+pending users and grant tabs to those users only, so the viewers' grants stay
+as seeded. The report lists per-rerun latency percentiles, the server's
+database connections (Postgres) and the server process's memory.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+ROOT_USERNAME = "root"
+ROOT_PASSWORD = "lapu"
+USER_PASSWORD = "loadtest"
+VIEWER_PREFIX = "loadtest_user_"
+PENDING_PREFIX = "loadtest_pending_"
+PERCENTILES = (50, 90, 95, 99)
+WIDGET_TYPES = ("button", "text_input", "selectbox", "multiselect")
+
+class Recorder:
+    """Collection of rerun timings and errors across sessions"""
+
+    def __init__(self):
+        self.timings = {}
+        self.errors = []
+
+    def record(self, action, elapsed):
+        self.timings.setdefault(action, []).append(elapsed)
+
+    def error(self, session, message):
+        self.errors.append(f"{session} {message}")
+
+class Session:
+    """One headless browser session on the server's websocket"""
+
+    def __init__(self, name, url, recorder, timeout):
+        self.name = name
+        self.url = url
+        self.recorder = recorder
+        self.timeout = timeout
+        self.widgets = []
+        self.exceptions = []
+        self._values = {}
+        self._page_script_hash = ""
+        self._ws = None
+
+    async def __aenter__(self):
+        self._ws = await websockets.connect(self.url, subprotocols=["streamlit"], max_size=None)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._ws.close()
+
+    def find(self, kind, label=None, key=None):
+        """First widget of kind with the given label, or whose id ends with the given key"""
+        for widget_kind, widget in self.widgets:
+            if widget_kind != kind:
+                continue
+            if label is not None and widget.label == label:
+                return widget
+            if key is not None and widget.id.endswith(f"-{key}"):
+                return widget
+        return None
+
+    def buttons(self, key_prefix):
+        return [widget for kind, widget in self.widgets if kind == "button" and f"-{key_prefix}" in widget.id]
+
+    def set_value(self, widget, value):
+        """Set a widget's value for this and every following rerun, as the browser does"""
+        state = WidgetState(id=widget.id)
+        if isinstance(value, list):
+            state.string_array_value.data.extend(value)
+        else:
+            state.string_value = value
+        self._values[widget.id] = state
+
+    async def run(self, action, trigger=None):
+        """Rerun the script, clicking the trigger button if given, and time it to completion"""
+        msg = BackMsg()
+        client_state = msg.rerun_script
+        client_state.page_script_hash = self._page_script_hash
+        client_state.widget_states.widgets.extend(self._values.values())
+        if trigger is not None:
+            client_state.widget_states.widgets.add(id=trigger.id, trigger_value=True)
+
+        start = time.perf_counter()
+        try:
+            await self._ws.send(msg.SerializeToString())
+            await asyncio.wait_for(self._receive(), self.timeout)
+        except Exception as e:
+            self.recorder.error(self.name, f"{action}: {type(e).__name__} {str(e)}")
+            return False
+        self.recorder.record(action, time.perf_counter() - start)
+
+        # Widgets gone from the page are no longer sent, as in the browser
+        current = {widget.id for _, widget in self.widgets}
+        self._values = {widget_id: state for widget_id, state in self._values.items() if widget_id in current}
+        for message in self.exceptions:
+            self.recorder.error(self.name, f"{action}: {message}")
+        return not self.exceptions
+
+    async def _receive(self):
+        # A run cut short by st.rerun() is followed by the full run
+        while True:
+            msg = ForwardMsg()
+            msg.ParseFromString(await self._ws.recv())
+            kind = msg.WhichOneof("type")
+            if kind == "new_session":
+                self._page_script_hash = msg.new_session.page_script_hash
+                self.widgets = []
+                self.exceptions = []
+            elif kind == "delta" and msg.delta.WhichOneof("type") == "new_element":
+                element = msg.delta.new_element
+                element_kind = element.WhichOneof("type")
+                if element_kind in WIDGET_TYPES:
+                    self.widgets.append((element_kind, getattr(element, element_kind)))
+                elif element_kind == "exception":
+                    self.exceptions.append(f"{element.exception.type}: {element.exception.message}")
+            elif kind == "script_finished":
+                status = msg.script_finished
+                if status == ForwardMsg.FINISHED_SUCCESSFULLY:
+                    return
+                if status == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    raise RuntimeError("script failed to compile")
+
+class ServerSampler:
+    """Samples the server process's resident memory, and its database connections on Postgres"""
+
+    def __init__(self, pid, database_url, interval=0.1):
+        self.pid = pid
+        self.database_url = database_url
+        self.interval = interval
+        self.rss = []
+        self.connections = []
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="server-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        from sqlalchemy import create_engine
+        from sqlalchemy.pool import NullPool
+
+        conn = None
+        if self.database_url.startswith("postgresql"):
+            conn = create_engine(self.database_url, poolclass=NullPool).connect()
+        try:
+            while not self._stopped.is_set():
+                rss = rss_bytes(self.pid)
+                if rss is not None:
+                    self.rss.append(rss)
+                if conn is not None:
+                    self.connections.append(conn.exec_driver_sql(
+                        "SELECT count(*) FROM pg_stat_activity "
+                        "WHERE datname = current_database() AND pid <> pg_backend_pid()"
+                    ).scalar())
+                    conn.rollback()
+                self._stopped.wait(self.interval)
+        finally:
+            if conn is not None:
+                conn.close()
+
+def rss_bytes(pid):
+    """Resident set size of a process (Linux), or None"""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(port, log_path, timeout):
+    """Start `streamlit run app.py` with this environment and wait until it is healthy"""
+    log = open(log_path, "w")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", APP_PATH,
+         "--server.headless", "true",
+         "--server.address", "127.0.0.1",
+         "--server.port", str(port),
+         "--server.fileWatcherType", "none",
+         "--browser.gatherUsageStats", "false"],
+        stdout=log, stderr=subprocess.STDOUT, env=os.environ.copy()
+    )
+    log.close()
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"Server exited with code {server.returncode}, see {log_path}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as response:
+                if response.status == 200:
+                    return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise SystemExit(f"Server did not become healthy within {timeout} seconds, see {log_path}")
+
+def stop_server(server):
+    server.terminate()
+    try:
+        server.wait(10)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+def seed(viewers, pending):
+    """Create approved viewers with access to every tab, plus users awaiting approval"""
+    from utils.auth import approve_user, create_user, manage_user_tabs
+    from utils.models import SessionLocal, Tab, User, engine
+
+    db = SessionLocal()
+    try:
+        tab_names = [tab.name for tab in db.query(Tab).all()]
+    finally:
+        db.close()
+
+    for i in range(viewers):
+        username = f"{VIEWER_PREFIX}{i}"
+        create_user(username, f"{username}@loadtest.local", USER_PASSWORD, first_name="Load", last_name=str(i))
+    for i in range(pending):
+        username = f"{PENDING_PREFIX}{i}"
+        create_user(username, f"{username}@loadtest.local", USER_PASSWORD, first_name="Pending", last_name=str(i))
+
+    db = SessionLocal()
+    try:
+        user_ids = [user_id for (user_id,) in db.query(User.id).filter(User.username.like(f"{VIEWER_PREFIX}%"))]
+    finally:
+        db.close()
+    for user_id in user_ids:
+        approve_user(ROOT_USERNAME, user_id)
+        manage_user_tabs(ROOT_USERNAME, user_id, tab_names)
+
+    # Only the server's connections should show up while measuring
+    engine.dispose()
+    return tab_names
+
+async def login(session, username, password):
+    await session.run("initial_load")
+    session.set_value(session.find("text_input", key="login_username"), username)
+    session.set_value(session.find("text_input", key="login_password"), password)
+    await session.run("login", trigger=session.find("button", key="login_button"))
+
+async def viewer_session(session, index, iterations):
+    await login(session, f"{VIEWER_PREFIX}{index}", USER_PASSWORD)
+    dashboard = session.find("selectbox", label="Select Dashboard")
+    if dashboard is None:
+        session.recorder.error(session.name, "login: no dashboard after logging in")
+        return
+    for _ in range(iterations):
+        for option in dashboard.options:
+            session.set_value(dashboard, option)
+            await session.run("switch_tab")
+            dashboard = session.find("selectbox", label="Select Dashboard")
+
+async def admin_session(session, index, iterations):
+    await login(session, ROOT_USERNAME, ROOT_PASSWORD)
+    for i in range(iterations):
+        approve_buttons = session.buttons("approve_")
+        if approve_buttons:
+            await session.run("approve_user", trigger=approve_buttons[0])
+
+        # Only pending users are granted tabs, never the seeded viewers
+        select_user = session.find("selectbox", label="Select User")
+        if select_user is None:
+            session.recorder.error(session.name, "admin controls missing")
+            return
+        targets = [option for option in select_user.options if option.startswith(PENDING_PREFIX)]
+        if targets:
+            session.set_value(select_user, targets[(index + i) % len(targets)])
+            await session.run("select_user")
+            tabs = session.find("multiselect", label="Select Accessible Tabs")
+            session.set_value(tabs, list(tabs.options[:1 + i % len(tabs.options)]))
+            await session.run("select_tabs")
+            await session.run("grant_tabs", trigger=session.find("button", label="Update Access"))
+
+SESSIONS = {"viewer": viewer_session, "admin": admin_session}
+
+async def run_session(kind, index, url, recorder, iterations, timeout):
+    name = f"{kind}-{index}"
+    try:
+        async with Session(name, url, recorder, timeout) as session:
+            await SESSIONS[kind](session, index, iterations)
+    except Exception as e:
+        recorder.error(name, f"aborted: {type(e).__name__} {str(e)}")
+
+async def run_sessions(sessions, url, recorder, iterations, timeout):
+    await asyncio.gather(*(
+        run_session(kind, index, url, recorder, iterations, timeout) for kind, index in sessions
+    ))
+
+async def warm_up(url, recorder, timeout):
+    async with Session("warmup", url, recorder, timeout) as session:
+        return await session.run("warmup")
+
+def percentile_report(timings):
+    values = sorted(timings)
+    report = {"count": len(values), "mean": statistics.fmean(values), "max": values[-1]}
+    for p in PERCENTILES:
+        report[f"p{p}"] = values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent-session load test for app.py")
+    parser.add_argument("--sessions", type=int, default=20, help="Concurrent viewer sessions")
+    parser.add_argument("--admin-sessions", type=int, default=2, help="Concurrent admin sessions")
+    parser.add_argument("--iterations", type=int, default=3, help="Tab sweeps / admin rounds per session")
+    parser.add_argument("--pending-users", type=int, default=None,
+                        help="Users left awaiting approval (default: admin sessions x iterations)")
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds allowed per rerun")
+    parser.add_argument("--port", type=int, default=None, help="Server port (default: a free one)")
+    parser.add_argument("--server-log", default="loadtest_server.log", help="File for the server's output")
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args(argv)
+
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        raise SystemExit("Set DATABASE_URL to the database the load test should seed and use")
+
+    port = args.port or free_port()
+    url = f"ws://127.0.0.1:{port}/_stcore/stream"
+    print(f"Starting server on port {port}...")
+    server = start_server(port, args.server_log, max(args.timeout, 60))
+    try:
+        # The first run initializes the database and the app's cached resources
+        warmup = Recorder()
+        if not asyncio.run(warm_up(url, warmup, max(args.timeout, 300))):
+            raise SystemExit(f"App failed to start: {'; '.join(warmup.errors)}")
+
+        pending = args.pending_users if args.pending_users is not None else args.admin_sessions * args.iterations
+        print(f"Seeding {args.sessions} viewers and {pending} pending users...")
+        seed(args.sessions, pending)
+
+        print(f"Running {args.sessions} viewer and {args.admin_sessions} admin sessions against one server...")
+        sessions = [("viewer", i) for i in range(args.sessions)] + [("admin", i) for i in range(args.admin_sessions)]
+        recorder = Recorder()
+        sampler = ServerSampler(server.pid, database_url)
+        rss_before = rss_bytes(server.pid)
+        sampler.start()
+        started = time.perf_counter()
+        asyncio.run(run_sessions(sessions, url, recorder, args.iterations, args.timeout))
+        duration = time.perf_counter() - started
+        sampler.stop()
+        rss_after = rss_bytes(server.pid)
+    finally:
+        stop_server(server)
+
+    all_timings = [t for values in recorder.timings.values() for t in values]
+    peak_rss = max(sampler.rss, default=None)
+    report = {
+        "sessions": len(sessions),
+        "duration_seconds": duration,
+        "reruns": len(all_timings),
+        "reruns_per_second": len(all_timings) / duration if duration else None,
+        "errors": len(recorder.errors),
+        "latency": percentile_report(all_timings) if all_timings else None,
+        "latency_by_action": {action: percentile_report(t) for action, t in sorted(recorder.timings.items())},
+        "server_db_connections": {
+            "max": max(sampler.connections, default=None),
+            "mean": statistics.fmean(sampler.connections) if sampler.connections else None,
+        },
+        "server_memory": {
+            "rss_before_bytes": rss_before,
+            "rss_peak_bytes": peak_rss,
+            "rss_after_bytes": rss_after,
+            "rss_growth_per_session_bytes": (peak_rss - rss_before) / len(sessions)
+            if rss_before is not None and peak_rss is not None else None,
+        },
+    }
+
+    print(json.dumps(report, indent=2, default=str))
+    for error in recorder.errors[:20]:
+        print(f"ERROR {error}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+
+if __name__ == "__main__":
+    main()
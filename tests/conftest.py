@@ -0,0 +1,29 @@
+import os
+import tempfile
+import pytest
+
+# Tests never touch the app's database: they use TEST_DATABASE_URL (e.g. a local
+# Postgres, which enables the partitioning tests) or a throwaway SQLite file
+os.environ['DATABASE_URL'] = os.getenv('TEST_DATABASE_URL') or \
+    f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
+
+@pytest.fixture
+def db():
+    """Session on freshly created tables with the default tabs"""
+    from sqlalchemy import text
+    from utils.models import Base, PARTITIONED, SessionLocal, engine, initialize_roles, initialize_tabs
+    from utils.partitioning import ARCHIVE_SCHEMA
+
+    if PARTITIONED:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {ARCHIVE_SCHEMA} CASCADE"))
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    session = SessionLocal()
+    initialize_roles(session)
+    initialize_tabs(session)
+    try:
+        yield session
+    finally:
+        session.close()
@@ -0,0 +1,66 @@
+from utils.access_index import AccessIndex, access_index, bump_access_version
+from utils.auth import approve_user, create_user, manage_user_tabs
+from utils.models import SessionLocal, Tab, User, UserRole
+
+def count_loads(index, monkeypatch):
+    loads = []
+    original = index._load
+
+    def load():
+        loads.append(1)
+        return original()
+    monkeypatch.setattr(index, "_load", load)
+    return loads
+
+def user_id(db, username):
+    return db.query(User.id).filter(User.username == username).scalar()
+
+def test_local_changes_do_not_rebuild(db, monkeypatch):
+    monkeypatch.setattr(access_index, "check_interval", 0)
+    create_user("admin", "admin@example.com", "secret", role=UserRole.SUPER_ADMIN)
+    access_index.invalidate()
+    assert access_index.is_super_admin("admin")
+
+    loads = count_loads(access_index, monkeypatch)
+    create_user("viewer", "viewer@example.com", "secret")
+    approve_user("admin", user_id(db, "viewer"))
+    manage_user_tabs("admin", user_id(db, "viewer"), ["sales"])
+
+    assert access_index.is_approved("viewer")
+    assert access_index.accessible_tabs("viewer") == {"sales"}
+    assert loads == []
+
+def test_changes_from_other_processes_rebuild(db, monkeypatch):
+    index = AccessIndex(check_interval=0)
+    create_user("viewer", "viewer@example.com", "secret")
+    assert not index.is_approved("viewer")
+
+    # Another process approves the user: only the database and its version change
+    other = SessionLocal()
+    try:
+        other.query(User).filter(User.username == "viewer").update({User.is_approved: True, User.is_active: True})
+        bump_access_version(other)
+        other.commit()
+    finally:
+        other.close()
+
+    loads = count_loads(index, monkeypatch)
+    assert index.is_approved("viewer")
+    assert loads == [1]
+
+def test_updates_during_build_are_replayed(db, monkeypatch):
+    index = AccessIndex()
+    create_user("viewer", "viewer@example.com", "secret")
+    viewer_id = user_id(db, "viewer")
+    sales_id = db.query(Tab.id).filter(Tab.name == "sales").scalar()
+    original = index._load
+
+    def load():
+        result = original()
+        # A grant committed after the build read user_tab_access
+        index.set_user_tabs(viewer_id, [sales_id])
+        return result
+    monkeypatch.setattr(index, "_load", load)
+
+    index.build()
+    assert index.accessible_tabs("viewer") == {"sales"}
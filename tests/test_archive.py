@@ -0,0 +1,52 @@
+from datetime import datetime
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from utils import archive
+from utils.models import CompanyData, Tab
+from utils.partitioning import clear_company_data, ensure_partitions
+
+@pytest.fixture(autouse=True)
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path / "archive"))
+
+def add_rows(db, tab, dates, value=1.0):
+    ensure_partitions(db, min(dates), max(dates))
+    for date in dates:
+        db.add(CompanyData(tab_id=tab.id, metric_name="Daily Sales", date=date, value=value))
+    db.commit()
+
+def test_archive_month_purges_hot_rows(db):
+    tab = db.query(Tab).filter(Tab.name == "sales").one()
+    add_rows(db, tab, [datetime(2020, 1, 5), datetime(2020, 1, 6), datetime(2020, 2, 1)])
+
+    archive.archive_month(db, datetime(2020, 1, 1))
+
+    assert list(archive.archived_months("sales")) == [datetime(2020, 1, 1)]
+    assert archive.read_archived("sales").num_rows == 2
+    assert db.query(CompanyData).count() == 1
+    # Nothing left to archive for January
+    assert archive.hot_months(db, datetime(2020, 2, 1)) == []
+
+def test_late_hot_rows_merge_into_archived_month(db):
+    tab = db.query(Tab).filter(Tab.name == "sales").one()
+    add_rows(db, tab, [datetime(2020, 1, 5)])
+    archive.archive_month(db, datetime(2020, 1, 1))
+    add_rows(db, tab, [datetime(2020, 1, 5), datetime(2020, 1, 6)], value=2.0)
+
+    archive.archive_month(db, datetime(2020, 1, 1))
+
+    rows = archive.read_archived("sales").to_pandas().sort_values("date")
+    assert rows["value"].tolist() == [2.0, 2.0]
+
+def test_clearing_company_data_clears_the_archive(db):
+    tab = db.query(Tab).filter(Tab.name == "sales").one()
+    add_rows(db, tab, [datetime(2020, 1, 5)])
+    archive.archive_month(db, datetime(2020, 1, 1), purge=False)
+    assert archive.archived_months("sales")
+
+    clear_company_data(db)
+
+    assert archive.archived_months("sales") == {}
+    assert archive.read_archived("sales").num_rows == 0
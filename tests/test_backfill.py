@@ -0,0 +1,42 @@
+import json
+from datetime import datetime
+import pytest
+from utils.backfill import CsvSource, backfill, generate_rows
+from utils.models import CompanyData
+
+START = datetime(2024, 1, 1)
+END = datetime(2024, 3, 1)
+
+def row_count(db):
+    return db.query(CompanyData).count()
+
+def test_rerun_does_not_duplicate_rows(db, tmp_path):
+    checkpoint = str(tmp_path / "checkpoint.json")
+    rows, failed = backfill(generate_rows, START, END, ["sales"], workers=2, checkpoint=checkpoint)
+    assert rows > 0 and not failed
+    assert row_count(db) == rows
+
+    # Resuming skips every finished task
+    assert backfill(generate_rows, START, END, ["sales"], workers=2, checkpoint=checkpoint) == (0, {})
+    assert row_count(db) == rows
+
+    # Without the checkpoint every task runs again and upserts the same rows
+    fresh = str(tmp_path / "fresh.json")
+    assert backfill(generate_rows, START, END, ["sales"], workers=2, checkpoint=fresh) == (rows, {})
+    assert row_count(db) == rows
+
+def test_checkpoint_records_source(db, tmp_path):
+    checkpoint = tmp_path / "checkpoint.json"
+    backfill(generate_rows, START, END, ["sales"], workers=2, checkpoint=str(checkpoint))
+    assert json.loads(checkpoint.read_text())['source'] == 'synthetic'
+
+def test_refuses_checkpoint_of_other_source(db, tmp_path):
+    checkpoint = str(tmp_path / "checkpoint.json")
+    backfill(generate_rows, START, END, ["sales"], workers=2, checkpoint=checkpoint)
+    count = row_count(db)
+
+    csv_path = tmp_path / "sales.csv"
+    csv_path.write_text("tab,metric_name,date,value\nsales,Daily Sales,2024-01-05,1.0\n")
+    with pytest.raises(ValueError, match="--restart"):
+        backfill(CsvSource(str(csv_path)), START, END, ["sales"], workers=2, checkpoint=checkpoint)
+    assert row_count(db) == count
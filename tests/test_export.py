@@ -0,0 +1,54 @@
+import csv
+import time
+from datetime import datetime, timedelta
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from utils import archive, export
+from utils.access_index import access_index
+from utils.auth import create_user
+from utils.models import CompanyData, Tab, UserRole
+from utils.partitioning import ensure_partitions
+
+@pytest.fixture
+def sales(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path / "archive"))
+    monkeypatch.setattr(export, "EXPORT_DIR", str(tmp_path / "exports"))
+    create_user("admin", "admin@example.com", "secret", role=UserRole.SUPER_ADMIN)
+    access_index.invalidate()
+
+    tab = db.query(Tab).filter(Tab.name == "sales").one()
+    start = datetime(2024, 1, 1)
+    ensure_partitions(db, start, start + timedelta(days=99))
+    db.add_all(CompanyData(tab_id=tab.id, metric_name="Daily Sales", date=start + timedelta(days=i), value=float(i))
+               for i in range(100))
+    db.commit()
+    return tab
+
+def test_csv_parts_join_into_one_file(sales, monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_PART_BYTES", 1024)
+
+    filenames, count, message = export.spool_tab_export("admin", "sales", "csv", chunk_size=10)
+
+    assert message == "Success"
+    assert count == 100
+    assert len(filenames) > 1
+    joined = "".join(open(f"{export.EXPORT_DIR}/{name}").read() for name in filenames)
+    rows = list(csv.reader(joined.splitlines()))
+    assert rows[0] == export.EXPORT_COLUMNS
+    assert [float(row[2]) for row in rows[1:]] == [float(i) for i in range(100)]
+
+def test_export_job_runs_in_background(sales):
+    job_id = export.export_jobs.submit("admin", "sales", "parquet")
+
+    deadline = time.monotonic() + 10
+    while export.export_jobs.status(job_id, "admin")["state"] == "running" and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    job = export.export_jobs.status(job_id, "admin")
+    assert job["state"] == "done"
+    assert job["count"] == 100
+    assert len(job["filenames"]) == 1
+    # Jobs are private to the user who started them
+    assert export.export_jobs.status(job_id, "someone_else") is None
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+from utils.metric_stats import get_metric_flags, update_metric_stats
+from utils.models import CompanyData, MetricStats, Tab
+from utils.partitioning import ensure_partitions
+
+START = datetime(2024, 1, 1)
+
+def add_points(db, metric_name, days, value=lambda day: float(day)):
+    tab = db.query(Tab).filter(Tab.name == "sales").one()
+    dates = [START + timedelta(days=day) for day in days]
+    ensure_partitions(db, min(dates), max(dates))
+    db.add_all(CompanyData(tab_id=tab.id, metric_name=metric_name, date=date, value=value(day))
+               for day, date in zip(days, dates))
+    db.commit()
+
+def stats(db, metric_name):
+    db.expire_all()
+    return db.query(MetricStats).filter(MetricStats.metric_name == metric_name).one()
+
+def test_folds_only_new_points(db):
+    add_points(db, "Daily Sales", range(10))
+    assert update_metric_stats() == 10
+    assert update_metric_stats() == 0
+
+    add_points(db, "Daily Sales", range(10, 15))
+    assert update_metric_stats() == 5
+    assert stats(db, "Daily Sales").last_date == START + timedelta(days=14)
+
+def test_changed_since_recomputes_metrics_past_it(db):
+    add_points(db, "Daily Sales", range(10, 20))
+    update_metric_stats()
+
+    add_points(db, "Daily Sales", range(10))
+    # Older points are invisible to the cursor...
+    assert update_metric_stats() == 0
+    # ...until the writer says where it wrote
+    assert update_metric_stats(changed_since=START) == 20
+    row = stats(db, "Daily Sales")
+    assert row.count == 20
+    assert row.mean == sum(range(20)) / 20
+
+def test_changed_since_discovers_metrics_with_only_old_history(db):
+    add_points(db, "Daily Sales", range(30, 40))
+    update_metric_stats()
+
+    add_points(db, "Orders Count", range(10))
+    assert update_metric_stats() == 0
+    # Daily Sales is recomputed too, since its cursor is past changed_since
+    assert update_metric_stats(changed_since=START) == 20
+    assert stats(db, "Orders Count").count == 10
+    assert set(get_metric_flags("sales")) == {"Daily Sales", "Orders Count"}
@@ -0,0 +1,80 @@
+import time
+from utils.notifications import FakeBackend, NotificationBackend, NotificationDispatcher, create_backend
+
+def test_backend_interface_is_abstract():
+    try:
+        NotificationBackend()
+    except TypeError:
+        return
+    raise AssertionError("NotificationBackend should not be instantiable")
+
+def test_notify_does_not_wait_for_slow_backend():
+    backend = FakeBackend(delay=0.5)
+    dispatcher = NotificationDispatcher(backend, workers=1, batch_size=1)
+
+    start = time.monotonic()
+    for i in range(10):
+        assert dispatcher.notify("+100", f"message {i}")
+    assert time.monotonic() - start < 0.25
+
+    dispatcher.close(timeout=0)
+    assert len(backend.sent) == 10
+
+def test_failed_batches_are_retried_with_backoff():
+    backend = FakeBackend(fail_times=2)
+    dispatcher = NotificationDispatcher(backend, workers=1, backoff_base=0.05, backoff_max=0.1)
+
+    start = time.monotonic()
+    dispatcher.notify("+100", "hello")
+    while not backend.sent and time.monotonic() - start < 5:
+        time.sleep(0.01)
+
+    assert list(backend.sent) == [("+100", "hello")]
+    assert backend.fail_times == 0
+    # Two backoff waits of at least half the base delay each
+    assert time.monotonic() - start >= 0.05
+    dispatcher.close()
+    assert dispatcher.pending == 0
+
+def test_gives_up_after_max_retries():
+    backend = FakeBackend(fail_times=10)
+    dispatcher = NotificationDispatcher(backend, workers=1, max_retries=1, backoff_base=0.01)
+
+    dispatcher.notify("+100", "hello")
+    dispatcher.close(timeout=2)
+    assert list(backend.sent) == []
+    assert dispatcher.pending == 0
+
+def test_drops_when_queue_is_full():
+    backend = FakeBackend()
+    # No workers, so nothing leaves the queue until close
+    dispatcher = NotificationDispatcher(backend, workers=0, maxsize=2)
+
+    assert dispatcher.notify("+100", "one")
+    assert dispatcher.notify("+100", "two")
+    assert not dispatcher.notify("+100", "three")
+    assert dispatcher.dropped == 1
+
+    dispatcher.close(timeout=0)
+    assert list(backend.sent) == [("+100", "one"), ("+100", "two")]
+
+def test_close_flushes_messages_waiting_in_backoff():
+    backend = FakeBackend(fail_times=1)
+    dispatcher = NotificationDispatcher(backend, workers=1, backoff_base=30, backoff_max=30)
+
+    dispatcher.notify("+100", "hello")
+    start = time.monotonic()
+    dispatcher.close(timeout=0.5)
+
+    assert time.monotonic() - start < 5
+    assert list(backend.sent) == [("+100", "hello")]
+    assert dispatcher.pending == 0
+
+def test_fake_backend_keeps_only_recent_messages():
+    backend = FakeBackend(max_sent=3)
+    backend.send_batch([("+100", f"message {i}") for i in range(5)])
+    assert [body for _, body in backend.sent] == ["message 2", "message 3", "message 4"]
+
+def test_no_backend_unless_configured():
+    assert create_backend('') is None
+    assert isinstance(create_backend('fake'), FakeBackend)
@@ -0,0 +1,94 @@
+from datetime import datetime
+import pytest
+
+pytest.importorskip("sqlalchemy")
+
+from sqlalchemy import text
+from utils.models import Base, CompanyData, PARTITIONED, Tab, engine
+from utils.partitioning import (
+    ARCHIVE_SCHEMA, DEFAULT_PARTITION, apply_retention, drop_month, ensure_default_partition,
+    ensure_partitions, list_partitions, partition_name
+)
+
+pytestmark = pytest.mark.skipif(not PARTITIONED, reason="set TEST_DATABASE_URL to a Postgres database")
+
+def add_row(db, date):
+    tab_id = db.query(Tab.id).filter(Tab.name == "sales").scalar()
+    db.add(CompanyData(tab_id=tab_id, metric_name="Daily Sales", date=date, value=1.0))
+    db.commit()
+
+def count(db, table):
+    return db.execute(text(f'SELECT count(*) FROM {table}')).scalar()
+
+def partitions(db):
+    return [name for name, _ in list_partitions(db)]
+
+def test_ensure_partitions_creates_each_month(db):
+    names = ensure_partitions(db, datetime(2030, 1, 15), datetime(2030, 3, 1))
+
+    assert names == ["company_data_y2030m01", "company_data_y2030m02", "company_data_y2030m03"]
+    assert partitions(db) == names
+    # Idempotent
+    assert ensure_partitions(db, datetime(2030, 1, 1), datetime(2030, 3, 1)) == names
+    assert partitions(db) == names
+
+def test_new_partition_takes_rows_from_default(db):
+    ensure_default_partition(db)
+    add_row(db, datetime(2031, 5, 10))
+    assert count(db, f'"{DEFAULT_PARTITION}"') == 1
+
+    ensure_partitions(db, datetime(2031, 5, 1), datetime(2031, 5, 1))
+
+    assert count(db, f'"{DEFAULT_PARTITION}"') == 0
+    assert count(db, f'"{partition_name(datetime(2031, 5, 1))}"') == 1
+    assert db.query(CompanyData).count() == 1
+
+def test_retention_drops_expired_partitions_and_default_rows(db):
+    ensure_partitions(db, datetime(2020, 1, 1), datetime(2020, 3, 1))
+    add_row(db, datetime(2019, 6, 1))   # no partition of its own, lands in DEFAULT
+    add_row(db, datetime(2020, 1, 10))
+    add_row(db, datetime(2020, 3, 10))
+
+    removed = apply_retention(db, keep_months=1, now=datetime(2020, 3, 15))
+
+    assert removed == ["company_data_y2020m01"]
+    assert "company_data_y2020m01" not in partitions(db)
+    assert [date for (date,) in db.query(CompanyData.date)] == [datetime(2020, 3, 10)]
+    # Retention also premakes the coming months
+    assert "company_data_y2020m06" in partitions(db)
+
+def test_archive_keeps_every_copy_of_a_month(db):
+    month = datetime(2020, 1, 1)
+    for _ in range(2):
+        ensure_partitions(db, month, month)
+        add_row(db, datetime(2020, 1, 10))
+        drop_month(db, month, archive=True)
+        assert partition_name(month) not in partitions(db)
+
+    archived = db.execute(text(
+        "SELECT table_name FROM information_schema.tables "
+        "WHERE table_schema = :schema AND table_name LIKE 'company_data_y2020m01_%'"
+    ), {"schema": ARCHIVE_SCHEMA}).scalars().all()
+    assert len(archived) == 2
+    for name in archived:
+        assert count(db, f'{ARCHIVE_SCHEMA}."{name}"') == 1
+    assert db.query(CompanyData).count() == 0
+
+    # Archived tables must not keep the parent's id sequence, or init_db could not drop company_data
+    db.close()
+    Base.metadata.drop_all(bind=engine)
+
+def test_drop_month_without_partition_takes_rows_from_default(db):
+    ensure_default_partition(db)
+    add_row(db, datetime(2019, 6, 1))
+    add_row(db, datetime(2019, 7, 1))
+
+    drop_month(db, datetime(2019, 6, 1), archive=True)
+
+    assert [date for (date,) in db.query(CompanyData.date)] == [datetime(2019, 7, 1)]
+    assert partition_name(datetime(2019, 6, 1)) not in partitions(db)
+    archived = db.execute(text(
+        "SELECT count(*) FROM information_schema.tables "
+        "WHERE table_schema = :schema AND table_name LIKE 'company_data_y2019m06_%'"
+    ), {"schema": ARCHIVE_SCHEMA}).scalar()
+    assert archived == 1
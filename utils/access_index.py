@@ -0,0 +1,262 @@
+import os
+import threading
+import time
+from .models import (
+    User, Tab, Employee, UserRole, AccessVersion, SessionLocal,
+    role_permissions, user_tab_access, user_employee_access
+)
+
+# Each process keeps its own index. Writers bump the access_version row in the
+# same transaction as the change; readers compare it at most every
+# ACCESS_INDEX_CHECK_INTERVAL seconds and rebuild when it moved. The TTL is a backstop.
+ACCESS_INDEX_TTL = float(os.getenv('ACCESS_INDEX_TTL', '300'))
+ACCESS_INDEX_CHECK_INTERVAL = float(os.getenv('ACCESS_INDEX_CHECK_INTERVAL', '2'))
+
+def bump_access_version(db):
+    """Mark access data as changed, returning the new version; call before committing the change itself"""
+    updated = db.query(AccessVersion).filter(AccessVersion.id == 1).update(
+        {AccessVersion.version: AccessVersion.version + 1}, synchronize_session=False
+    )
+    if not updated:
+        db.add(AccessVersion(id=1, version=1))
+        db.flush()
+    # The update holds the row lock, so this reads our own bump
+    return read_access_version(db)
+
+def read_access_version(db):
+    return db.query(AccessVersion.version).filter(AccessVersion.id == 1).scalar() or 0
+
+class AccessIndex:
+    """In-memory access matrix: per-user tab bitsets, employee visibility sets and role permissions"""
+
+    def __init__(self, ttl=ACCESS_INDEX_TTL, check_interval=ACCESS_INDEX_CHECK_INTERVAL):
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._lock = threading.RLock()
+        # Only one thread builds at a time; the others wait and reuse its result
+        self._build_lock = threading.Lock()
+        self._built_at = None
+        self._checked_at = None
+        self._version = None
+        # Updates made while a build is reading, replayed onto its result
+        self._replay = None
+        self._users = {}             # username -> user id
+        self._roles = {}             # user id -> role name
+        self._approved = set()       # user ids that are active and approved
+        self._tab_ids = {}           # tab name -> tab id
+        self._tab_bits = {}          # user id -> int bitset over tab ids
+        self._employees = {}         # user id -> set of employee ids
+        self._shared_employees = set()
+        self._role_permissions = {}  # role name -> set of permission values
+
+    def build(self):
+        """Load the whole matrix with one query per table"""
+        requested = time.monotonic()
+        with self._build_lock:
+            with self._lock:
+                if self._built_at is not None and self._built_at >= requested:
+                    return
+                self._replay = []
+            try:
+                users, roles, approved, tab_ids, tab_bits, employees, shared, permissions, version = self._load()
+            except Exception:
+                with self._lock:
+                    self._replay = None
+                raise
+
+            with self._lock:
+                self._users, self._roles, self._approved = users, roles, approved
+                self._tab_ids, self._tab_bits, self._employees = tab_ids, tab_bits, employees
+                self._shared_employees, self._role_permissions = shared, permissions
+                self._version = version
+                # The reads may predate these updates, so apply them again on top
+                for update, update_version in self._replay:
+                    update()
+                    self._advance(update_version)
+                self._replay = None
+                self._built_at = self._checked_at = time.monotonic()
+
+    def _load(self):
+        db = SessionLocal()
+        try:
+            # Read the version first: a change committed during the reads bumps it past this value
+            version = read_access_version(db)
+
+            users, roles, approved = {}, {}, set()
+            for user_id, username, role_name, is_active, is_approved in db.query(
+                User.id, User.username, User.role_name, User.is_active, User.is_approved
+            ):
+                users[username] = user_id
+                roles[user_id] = role_name
+                if is_active and is_approved:
+                    approved.add(user_id)
+
+            tab_ids = {name: tab_id for tab_id, name in db.query(Tab.id, Tab.name)}
+
+            tab_bits = {}
+            for user_id, tab_id in db.query(user_tab_access.c.user_id, user_tab_access.c.tab_id):
+                tab_bits[user_id] = tab_bits.get(user_id, 0) | (1 << tab_id)
+
+            employees = {}
+            for user_id, employee_id in db.query(user_employee_access.c.user_id, user_employee_access.c.employee_id):
+                employees.setdefault(user_id, set()).add(employee_id)
+
+            shared = {employee_id for (employee_id,) in db.query(Employee.id).filter(Employee.is_shared == True)}
+
+            permissions = {}
+            for role_name, permission in db.query(role_permissions.c.role_name, role_permissions.c.permission):
+                permissions.setdefault(role_name, set()).add(permission)
+            return users, roles, approved, tab_ids, tab_bits, employees, shared, permissions, version
+        finally:
+            db.close()
+
+    def invalidate(self):
+        """Force a rebuild on the next lookup"""
+        with self._lock:
+            self._built_at = None
+
+    def _ensure_fresh(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._built_at is None or now - self._built_at > self.ttl:
+                stale = True
+            elif now - self._checked_at < self.check_interval:
+                return
+            else:
+                self._checked_at = now
+                stale = False
+
+        if not stale:
+            db = SessionLocal()
+            try:
+                version = read_access_version(db)
+            finally:
+                db.close()
+            with self._lock:
+                if version == self._version:
+                    return
+        self.build()
+
+    # Lookups
+
+    def user_id(self, username):
+        self._ensure_fresh()
+        return self._users.get(username)
+
+    def is_super_admin(self, username):
+        self._ensure_fresh()
+        user_id = self._users.get(username)
+        return user_id is not None and self._roles.get(user_id) == UserRole.SUPER_ADMIN.value
+
+    def is_approved(self, username):
+        self._ensure_fresh()
+        return self._users.get(username) in self._approved
+
+    def tab_id(self, tab_name):
+        self._ensure_fresh()
+        return self._tab_ids.get(tab_name)
+
+    def has_permission(self, username, permission):
+        self._ensure_fresh()
+        with self._lock:
+            user_id = self._users.get(username)
+            if user_id is None:
+                return False
+            role_name = self._roles.get(user_id)
+            if role_name == UserRole.SUPER_ADMIN.value:
+                return True
+            return permission.value in self._role_permissions.get(role_name, ())
+
+    def can_access_tab(self, username, tab_name):
+        self._ensure_fresh()
+        with self._lock:
+            user_id = self._users.get(username)
+            tab_id = self._tab_ids.get(tab_name)
+            if user_id is None or tab_id is None:
+                return False
+            if self._roles.get(user_id) == UserRole.SUPER_ADMIN.value:
+                return True
+            return bool(self._tab_bits.get(user_id, 0) >> tab_id & 1)
+
+    def accessible_tabs(self, username):
+        """Tab names the user has been granted"""
+        self._ensure_fresh()
+        with self._lock:
+            bits = self._tab_bits.get(self._users.get(username), 0)
+            return {name for name, tab_id in self._tab_ids.items() if bits >> tab_id & 1}
+
+    def visible_employee_ids(self, username):
+        """Employee ids the user can see, or None when the user can see all of them"""
+        self._ensure_fresh()
+        with self._lock:
+            user_id = self._users.get(username)
+            if user_id is None:
+                return set()
+            if self._roles.get(user_id) == UserRole.SUPER_ADMIN.value:
+                return None
+            return self._shared_employees | self._employees.get(user_id, set())
+
+    def tab_matrix(self):
+        """Usernames per tab for the admin access overview"""
+        self._ensure_fresh()
+        with self._lock:
+            names = {user_id: username for username, user_id in self._users.items()}
+            return {
+                tab_name: sorted(names[user_id] for user_id, bits in self._tab_bits.items()
+                                 if bits >> tab_id & 1 and user_id in names)
+                for tab_name, tab_id in self._tab_ids.items()
+            }
+
+    # Incremental updates, applied after the matching database commit. Each takes the version
+    # bump_access_version returned for the change: when it directly follows the index's version
+    # the index stays current without a rebuild, otherwise another process changed something
+    # too and the next check rebuilds.
+
+    def _apply(self, update, version=None):
+        with self._lock:
+            update()
+            self._advance(version)
+            if self._replay is not None:
+                self._replay.append((update, version))
+
+    def _advance(self, version):
+        if version is not None and self._version is not None and version == self._version + 1:
+            self._version = version
+
+    def add_user(self, user_id, username, role_name, approved=False, version=None):
+        def update():
+            self._users[username] = user_id
+            self._roles[user_id] = role_name
+            if approved:
+                self._approved.add(user_id)
+        self._apply(update, version)
+
+    def set_approved(self, user_id, approved=True, version=None):
+        def update():
+            if approved:
+                self._approved.add(user_id)
+            else:
+                self._approved.discard(user_id)
+        self._apply(update, version)
+
+    def set_user_tabs(self, user_id, tab_ids, version=None):
+        bits = 0
+        for tab_id in tab_ids:
+            bits |= 1 << tab_id
+
+        def update():
+            self._tab_bits[user_id] = bits
+        self._apply(update, version)
+
+    def add_employee(self, employee_id, is_shared=False, version=None):
+        def update():
+            if is_shared:
+                self._shared_employees.add(employee_id)
+        self._apply(update, version)
+
+    def grant_employee(self, user_id, employee_id, version=None):
+        def update():
+            self._employees.setdefault(user_id, set()).add(employee_id)
+        self._apply(update, version)
+
+access_index = AccessIndex()
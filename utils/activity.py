@@ -0,0 +1,170 @@
+import atexit
+import json
+import os
+import queue
+import threading
+from datetime import datetime
+from sqlalchemy import insert
+from .models import ActivityEvent, SessionLocal, engine
+
+# Events go to the activity_events table, or to a JSONL file with ACTIVITY_BACKEND=jsonl.
+# The file is also the fallback when a database write fails.
+ACTIVITY_BACKEND = os.getenv('ACTIVITY_BACKEND', 'db')
+ACTIVITY_LOG_PATH = os.getenv('ACTIVITY_LOG_PATH', os.path.join('data', 'activity.jsonl'))
+ACTIVITY_QUEUE_SIZE = int(os.getenv('ACTIVITY_QUEUE_SIZE', '10000'))
+ACTIVITY_BATCH_SIZE = int(os.getenv('ACTIVITY_BATCH_SIZE', '500'))
+ACTIVITY_FLUSH_INTERVAL = float(os.getenv('ACTIVITY_FLUSH_INTERVAL', '2'))
+# How long a caller may wait on a full queue before the event is dropped
+ACTIVITY_ENQUEUE_TIMEOUT = float(os.getenv('ACTIVITY_ENQUEUE_TIMEOUT', '0.05'))
+
+class ActivityLogger:
+    """Queues activity events and inserts them in batches from a background thread"""
+
+    def __init__(self, backend=ACTIVITY_BACKEND, path=ACTIVITY_LOG_PATH,
+                 maxsize=ACTIVITY_QUEUE_SIZE, batch_size=ACTIVITY_BATCH_SIZE,
+                 interval=ACTIVITY_FLUSH_INTERVAL, enqueue_timeout=ACTIVITY_ENQUEUE_TIMEOUT):
+        self.backend = backend
+        self.path = path
+        self.batch_size = batch_size
+        self.interval = interval
+        self.enqueue_timeout = enqueue_timeout
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def log(self, username, action, target=None, **details):
+        """Enqueue an event, returning False if it was dropped because the queue is full"""
+        event = {
+            'created_at': datetime.utcnow(),
+            'username': username,
+            'action': action,
+            'target': None if target is None else str(target),
+            'details': json.dumps(details, default=str) if details else None,
+        }
+        self._ensure_started()
+        try:
+            self._queue.put(event, timeout=self.enqueue_timeout)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                if self.dropped % 1000 == 1:
+                    print(f"Activity queue full, {self.dropped} events dropped so far")
+            return False
+
+    def close(self):
+        """Stop the writer thread once everything queued has been written"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        while not self._queue.empty():
+            self._write(self._drain())
+
+    def _ensure_started(self):
+        if self._thread is not None or self._stopped.is_set():
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="activity-writer", daemon=True)
+                self._thread.start()
+
+    def _drain(self, first=None):
+        batch = [first] if first else []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                first = self._queue.get(timeout=self.interval)
+            except queue.Empty:
+                continue
+            self._write(self._drain(first))
+
+    def _write(self, batch):
+        if not batch:
+            return
+        if self.backend == 'db':
+            try:
+                with engine.begin() as conn:
+                    conn.execute(insert(ActivityEvent), batch)
+                return
+            except Exception as e:
+                print(f"Error writing activity events, falling back to {self.path}: {str(e)}")
+        self._append_jsonl(batch)
+
+    def _append_jsonl(self, batch):
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'a') as f:
+                for event in batch:
+                    f.write(json.dumps(event, default=str) + "\n")
+        except Exception as e:
+            print(f"Error writing activity log file: {str(e)}")
+
+activity_log = ActivityLogger()
+atexit.register(activity_log.close)
+
+def log_activity(username, action, target=None, **details):
+    """Record an activity event without blocking the caller"""
+    return activity_log.log(username, action, target, **details)
+
+def _event_dict(event):
+    return {
+        'created_at': event.created_at,
+        'username': event.username,
+        'action': event.action,
+        'target': event.target,
+        'details': json.loads(event.details) if event.details else {},
+    }
+
+def get_activity(username: str = None, start_date: datetime = None, end_date: datetime = None,
+                 action: str = None, limit: int = 100):
+    """Get recent activity events, newest first, filtered by user, time range and action"""
+    if activity_log.backend != 'db':
+        return _read_jsonl(username, start_date, end_date, action, limit)
+
+    db = SessionLocal()
+    try:
+        query = db.query(ActivityEvent)
+        if username:
+            query = query.filter(ActivityEvent.username == username)
+        if start_date:
+            query = query.filter(ActivityEvent.created_at >= start_date)
+        if end_date:
+            query = query.filter(ActivityEvent.created_at < end_date)
+        if action:
+            query = query.filter(ActivityEvent.action == action)
+        events = query.order_by(ActivityEvent.created_at.desc()).limit(limit).all()
+        return [_event_dict(event) for event in events]
+    finally:
+        db.close()
+
+def _read_jsonl(username, start_date, end_date, action, limit):
+    """Scan the JSONL fallback file; meant for local use, not large logs"""
+    if not os.path.exists(activity_log.path):
+        return []
+
+    events = []
+    with open(activity_log.path) as f:
+        for line in f:
+            event = json.loads(line)
+            event['created_at'] = datetime.fromisoformat(event['created_at'])
+            if username and event['username'] != username:
+                continue
+            if start_date and event['created_at'] < start_date:
+                continue
+            if end_date and event['created_at'] >= end_date:
+                continue
+            if action and event['action'] != action:
+                continue
+            event['details'] = json.loads(event['details']) if event['details'] else {}
+            events.append(event)
+    events.sort(key=lambda e: e['created_at'], reverse=True)
+    return events[:limit]
@@ -0,0 +1,235 @@
+import argparse
+import os
+from datetime import datetime
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from sqlalchemy import and_, exists, func, not_
+from .models import CompanyData, Tab, SessionLocal
+from .company_data import check_tab_access
+from .partitioning import month_start, add_months, drop_month
+
+# Closed months are exported per tab to ARCHIVE_DIR/<tab>/<YYYY-MM>.<arrow|parquet>
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', os.path.join('data', 'archive'))
+ARCHIVE_FORMATS = {'arrow': '.arrow', 'parquet': '.parquet'}
+
+ARROW_SCHEMA = pa.schema([
+    ('date', pa.timestamp('us')),
+    ('metric_name', pa.string()),
+    ('value', pa.float64()),
+    ('notes', pa.string()),
+])
+
+FRAME_COLUMNS = ['date', 'metric_name', 'value']
+
+def archive_path(tab_name, month, fmt='arrow'):
+    """Location of the archive file for one tab and month"""
+    return os.path.join(ARCHIVE_DIR, tab_name, f"{month:%Y-%m}{ARCHIVE_FORMATS[fmt]}")
+
+def clear_archive():
+    """Delete every archive file, for when the hot data they were exported from is reset"""
+    if not os.path.isdir(ARCHIVE_DIR):
+        return
+    for tab_name in os.listdir(ARCHIVE_DIR):
+        for path in archived_months(tab_name).values():
+            os.remove(path)
+
+def archived_months(tab_name):
+    """Map of archived month start -> file path for a tab"""
+    tab_dir = os.path.join(ARCHIVE_DIR, tab_name)
+    if not os.path.isdir(tab_dir):
+        return {}
+
+    months = {}
+    for filename in os.listdir(tab_dir):
+        stem, ext = os.path.splitext(filename)
+        if ext not in ARCHIVE_FORMATS.values():
+            continue
+        try:
+            month = datetime.strptime(stem, "%Y-%m")
+        except ValueError:
+            continue
+        months[month] = os.path.join(tab_dir, filename)
+    return dict(sorted(months.items()))
+
+def _archived_ranges(months):
+    """Collapse archived months into contiguous [start, end) ranges"""
+    ranges = []
+    for month in sorted(months):
+        if ranges and ranges[-1][1] == month:
+            ranges[-1][1] = add_months(month, 1)
+        else:
+            ranges.append([month, add_months(month, 1)])
+    return ranges
+
+def merge_rows(cold, hot):
+    """Combine archived and hot rows of the same period; hot rows win on (date, metric_name)"""
+    frames = [df for df in (cold, hot) if df is not None and not df.empty]
+    if not frames:
+        return pd.DataFrame(columns=cold.columns if cold is not None else FRAME_COLUMNS)
+    df = pd.concat(frames, ignore_index=True)
+    df['date'] = pd.to_datetime(df['date'])
+    return df.drop_duplicates(subset=['date', 'metric_name'], keep='last')
+
+def export_tab_month(db, tab, month, fmt='arrow'):
+    """Write one tab's hot rows for a closed month to its archive file, merging into an existing one"""
+    month = month_start(month)
+    rows = db.query(
+        CompanyData.date, CompanyData.metric_name, CompanyData.value, CompanyData.notes
+    ).filter(
+        CompanyData.tab_id == tab.id,
+        CompanyData.date >= month,
+        CompanyData.date < add_months(month, 1)
+    ).all()
+    if not rows:
+        return None, 0
+
+    hot = pd.DataFrame(rows, columns=ARROW_SCHEMA.names)
+    existing = archived_months(tab.name).get(month)
+    cold = read_archive_file(existing).to_pandas() if existing else None
+    merged = merge_rows(cold, hot).sort_values('date', ignore_index=True)
+    table = pa.Table.from_pandas(merged, schema=ARROW_SCHEMA, preserve_index=False)
+
+    path = archive_path(tab.name, month, fmt)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # Write to a temporary file first so readers never see a partial archive
+    tmp_path = f"{path}.tmp"
+    if fmt == 'parquet':
+        pq.write_table(table, tmp_path)
+    else:
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with ipc.new_file(sink, ARROW_SCHEMA) as writer:
+                writer.write_table(table)
+    os.replace(tmp_path, path)
+
+    # The month now lives in the new format only
+    if existing and existing != path:
+        os.remove(existing)
+    return path, len(rows)
+
+def archive_month(db, month, fmt='arrow', purge=True):
+    """Export a closed month for every tab, then drop it from the hot table"""
+    month = month_start(month)
+    if month >= month_start(datetime.utcnow()):
+        raise ValueError(f"Month {month:%Y-%m} is not closed yet")
+
+    for tab in db.query(Tab).all():
+        path, count = export_tab_month(db, tab, month, fmt)
+        if path:
+            print(f"Archived {count} rows of {tab.name} to {path}")
+
+    if purge:
+        drop_month(db, month)
+        print(f"Removed {month:%Y-%m} from the hot table")
+
+def hot_months(db, cutoff):
+    """Month starts before cutoff that still have rows in the hot table"""
+    oldest = db.query(func.min(CompanyData.date)).scalar()
+    if oldest is None:
+        return []
+
+    months = []
+    month = month_start(oldest)
+    while month < cutoff:
+        # Index range probe per month; purged months cost nothing
+        if db.query(exists().where(
+            CompanyData.date >= month, CompanyData.date < add_months(month, 1)
+        )).scalar():
+            months.append(month)
+        month = add_months(month, 1)
+    return months
+
+def archive_before(db, cutoff, fmt='arrow', purge=True):
+    """Archive every month with hot data strictly before cutoff"""
+    months = hot_months(db, month_start(cutoff))
+    for month in months:
+        archive_month(db, month, fmt=fmt, purge=purge)
+    return months
+
+def read_archive_file(path):
+    """Read an archive file through a memory map"""
+    if path.endswith(ARCHIVE_FORMATS['parquet']):
+        return pq.read_table(path, memory_map=True)
+    # Arrow IPC buffers point straight into the mapping, no copy is made
+    source = pa.memory_map(path, 'r')
+    return ipc.open_file(source).read_all()
+
+def read_archived(tab_name, start_date=None, end_date=None):
+    """Load archived rows for a tab within [start_date, end_date) as an Arrow table"""
+    tables = []
+    for month, path in archived_months(tab_name).items():
+        if start_date and add_months(month, 1) <= start_date:
+            continue
+        if end_date and month >= end_date:
+            continue
+        tables.append(read_archive_file(path))
+
+    if not tables:
+        return ARROW_SCHEMA.empty_table()
+
+    table = pa.concat_tables(tables)
+    if start_date:
+        table = table.filter(pc.greater_equal(table['date'], pa.scalar(start_date, pa.timestamp('us'))))
+    if end_date:
+        table = table.filter(pc.less(table['date'], pa.scalar(end_date, pa.timestamp('us'))))
+    return table
+
+def hot_row_conditions(tab_id, start_date=None, end_date=None):
+    """Filters selecting a tab's hot rows in range"""
+    conditions = [CompanyData.tab_id == tab_id]
+    if start_date:
+        conditions.append(CompanyData.date >= start_date)
+    if end_date:
+        conditions.append(CompanyData.date < end_date)
+    return conditions
+
+def outside_archive_conditions(months):
+    """Filters excluding rows of archived months, for readers that merge those months separately"""
+    return [
+        not_(and_(CompanyData.date >= start, CompanyData.date < end))
+        for start, end in _archived_ranges(months)
+    ]
+
+def load_tab_frame(username: str, tab_name: str, start_date: datetime = None, end_date: datetime = None):
+    """Get tab data as a DataFrame, merging archived months with hot rows"""
+    db = SessionLocal()
+    try:
+        tab, message = check_tab_access(db, username, tab_name)
+        if not tab:
+            return None, message
+
+        cold = read_archived(tab_name, start_date, end_date)
+        cold = cold.select(FRAME_COLUMNS).to_pandas() if cold.num_rows else None
+
+        # Hot rows written into an archived month (e.g. by a backfill) override the archive.
+        # Purged months have no partition left, so this stays a pruned index range query.
+        hot = db.query(
+            CompanyData.date, CompanyData.metric_name, CompanyData.value
+        ).filter(*hot_row_conditions(tab.id, start_date, end_date)).all()
+        hot = pd.DataFrame(hot, columns=FRAME_COLUMNS) if hot else None
+
+        df = merge_rows(cold, hot)
+        return df.sort_values('date', ascending=False, ignore_index=True), "Success"
+    finally:
+        db.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export closed months of company data to the cold tier")
+    parser.add_argument("--before", required=True, type=lambda s: datetime.strptime(s, "%Y-%m"),
+                        help="Archive every month before this one (YYYY-MM)")
+    parser.add_argument("--format", choices=sorted(ARCHIVE_FORMATS), default="arrow")
+    parser.add_argument("--keep-hot", action="store_true",
+                        help="Leave archived rows in the database")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        archive_before(db, args.before, fmt=args.format, purge=not args.keep_hot)
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,10 @@ import re
 from sqlalchemy.orm import Session
 from .models import User, UserRole, Permission, Tab, Role, get_db, role_permissions, user_tab_access, SessionLocal
 from datetime import datetime
+from .login_buffer import login_buffer
+from .activity import log_activity
+from .notifications import notify_admins
+from .access_index import access_index, bump_access_version
 
 def hash_password(password):
     """Hash password using SHA-256"""
@@ -31,12 +35,11 @@ def authenticate_user(username_or_email, password):
                    .first())
 
         if user and user.password == hash_password(password):
-            # Update last login time
-            user.last_login = datetime.utcnow()
-            db.commit()
-            # Keep the session open for this user
-            db.refresh(user)
+            # Last login time is written behind by the login buffer
+            login_buffer.record(user.id, datetime.utcnow())
+            log_activity(user.username, "login")
             return True, user
+        log_activity(username_or_email, "login_failed")
         return False, None
     except Exception as e:
         db.rollback()
@@ -72,8 +75,14 @@ def create_user(username, email, password, first_name="", last_name="", role=Use
             created_at=datetime.utcnow()
         )
         db.add(new_user)
+        # Flush for the id so the index can be updated without reloading the row after commit
+        db.flush()
+        user_id = new_user.id
+        version = bump_access_version(db)
         db.commit()
-        db.refresh(new_user)
+        access_index.add_user(user_id, username, role.value, approved=role == UserRole.SUPER_ADMIN, version=version)
+        if role != UserRole.SUPER_ADMIN:
+            notify_admins(f"New registration awaiting approval: {username} ({email})")
         return True, "Registration successful" if role == UserRole.SUPER_ADMIN else "Registration successful. Waiting for admin approval."
     except Exception as e:
         db.rollback()
@@ -153,7 +162,9 @@ def create_super_admin(username, email, password, first_name="", last_name=""):
         print("Adding tab access...")
         tabs = db.query(Tab).all()
         new_user.accessible_tabs = tabs
+        bump_access_version(db)
         db.commit()
+        access_index.invalidate()
         print("Super admin setup completed successfully")
         return True, "Super admin created successfully"
     except Exception as e:
@@ -165,23 +176,8 @@ def create_super_admin(username, email, password, first_name="", last_name=""):
 
 def has_permission(username, permission):
     """Check if user has specific permission"""
-    db = SessionLocal()
-    try:
-        user = db.query(User).filter(User.username == username).first()
-        if not user:
-            return False
-
-        # Super admin has all permissions
-        if user.role_name == UserRole.SUPER_ADMIN.value:
-            return True
-
-        # Check role permissions
-        role_perms = db.query(role_permissions).filter(
-            role_permissions.c.role_name == user.role_name
-        ).all()
-        return any(perm.permission == permission.value for perm in role_perms)
-    finally:
-        db.close()
+    # Resolved from the in-memory access index; super admin has all permissions
+    return access_index.has_permission(username, permission)
 
 def manage_user_tabs(admin_username: str, user_id: int, tab_names: list):
     """Manage which tabs a user can access (only super admin)"""
@@ -202,7 +198,15 @@ def manage_user_tabs(admin_username: str, user_id: int, tab_names: list):
         tabs = db.query(Tab).filter(Tab.name.in_(tab_names)).all()
         user.accessible_tabs = tabs
 
+        # Capture names and ids before commit expires them, to avoid reloading each row
+        username = user.username
+        granted = [tab.name for tab in tabs]
+        tab_ids = [tab.id for tab in tabs]
+
+        version = bump_access_version(db)
         db.commit()
+        access_index.set_user_tabs(user_id, tab_ids, version=version)
+        log_activity(admin_username, "manage_user_tabs", target=username, tabs=granted)
         return True, "User tab access updated successfully"
     except Exception as e:
         db.rollback()
@@ -224,8 +228,13 @@ def approve_user(admin_username: str, user_id: int):
 
         user.is_approved = True
         user.is_active = True
+        username = user.username
+        version = bump_access_version(db)
         db.commit()
-        return True, f"User {user.username} has been approved"
+        access_index.set_approved(user_id, version=version)
+        log_activity(admin_username, "approve_user", target=username)
+        notify_admins(f"User {username} was approved by {admin_username}")
+        return True, f"User {username} has been approved"
     except Exception as e:
         db.rollback()
         return False, f"Failed to approve user: {str(e)}"
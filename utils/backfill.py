@@ -0,0 +1,243 @@
+import argparse
+import csv
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from .models import CompanyData, DATABASE_URL, SessionLocal, Tab, TabType, engine
+from .company_data import SAMPLE_METRICS, sample_value
+from .partitioning import add_months, ensure_partitions, month_start, premake_partitions
+from .metric_stats import update_metric_stats
+
+DEFAULT_CHECKPOINT = os.path.join('data', 'backfill_checkpoint.json')
+DEFAULT_BATCH_SIZE = 5000
+
+# Engine owned by each worker process, created by _init_worker
+_worker_engine = None
+
+def plan_tasks(tab_names, start_date, end_date):
+    """Split [start_date, end_date) into (tab, chunk start, chunk end) tasks along month boundaries"""
+    tasks = []
+    for tab_name in tab_names:
+        chunk_start = start_date
+        while chunk_start < end_date:
+            chunk_end = min(add_months(month_start(chunk_start), 1), end_date)
+            tasks.append((tab_name, chunk_start, chunk_end))
+            chunk_start = chunk_end
+    return tasks
+
+def task_key(task):
+    tab_name, chunk_start, chunk_end = task
+    return f"{tab_name}:{chunk_start:%Y-%m-%d}:{chunk_end:%Y-%m-%d}"
+
+def load_checkpoint(path):
+    """Source identity and keys of tasks finished by earlier runs"""
+    if not os.path.exists(path):
+        return None, set()
+    with open(path) as f:
+        data = json.load(f)
+    return data.get('source'), set(data.get('completed', []))
+
+def save_checkpoint(path, source, completed, failed=None):
+    """Persist the source identity, finished task keys and the errors of failed ones, atomically"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({
+            'source': source,
+            'completed': sorted(completed),
+            'failed': failed or {},
+            'updated_at': datetime.utcnow().isoformat()
+        }, f)
+    os.replace(tmp_path, path)
+
+# Row sources are called as source(tab_name, tab_id, chunk_start, chunk_end) in the
+# worker processes and yield CompanyData row dicts; they must be picklable
+
+def generate_rows(tab_name, tab_id, chunk_start, chunk_end):
+    """Synthetic daily sample points for one tab; values are seeded per point so reruns write the same data"""
+    metrics = SAMPLE_METRICS[TabType(tab_name)]
+    day = datetime(chunk_start.year, chunk_start.month, chunk_start.day)
+    if day < chunk_start:
+        day += timedelta(days=1)
+    while day < chunk_end:
+        for metric_name, low, high, integer in metrics:
+            rng = random.Random(f"{tab_name}:{metric_name}:{day:%Y-%m-%d}")
+            yield {
+                'date': day,
+                'tab_id': tab_id,
+                'metric_name': metric_name,
+                'value': sample_value(low, high, integer, rng),
+                'notes': None,
+            }
+        day += timedelta(days=1)
+
+class CsvSource:
+    """Reads rows from CSV with tab, metric_name, date, value and optional notes columns
+
+    A {tab} placeholder in the path selects one file per tab. Otherwise every
+    task scans the whole file for its tab and date range.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.identity = f"csv:{os.path.abspath(path)}"
+
+    def __call__(self, tab_name, tab_id, chunk_start, chunk_end):
+        per_tab = '{tab}' in self.path
+        with open(self.path.format(tab=tab_name), newline='') as f:
+            for record in csv.DictReader(f):
+                if not per_tab and record['tab'] != tab_name:
+                    continue
+                date = datetime.fromisoformat(record['date'])
+                if not chunk_start <= date < chunk_end:
+                    continue
+                yield {
+                    'date': date,
+                    'tab_id': tab_id,
+                    'metric_name': record['metric_name'],
+                    'value': float(record['value']),
+                    'notes': record.get('notes') or None,
+                }
+
+def source_identity(source):
+    """Name recorded in the checkpoint, so a resume never mixes rows from two sources"""
+    if source is generate_rows:
+        return 'synthetic'
+    return getattr(source, 'identity', None) or f"{source.__module__}.{source.__qualname__}"
+
+def upsert_statement(dialect_name):
+    """INSERT ... ON CONFLICT (tab_id, metric_name, date) DO UPDATE for the engine's dialect"""
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise ValueError(f"Upserts are not supported for {dialect_name}")
+
+    stmt = insert(CompanyData.__table__)
+    return stmt.on_conflict_do_update(
+        index_elements=['tab_id', 'metric_name', 'date'],
+        set_={'value': stmt.excluded.value, 'notes': stmt.excluded.notes}
+    )
+
+def _init_worker():
+    global _worker_engine
+    # Never reuse connections inherited from the parent process
+    engine.dispose(close=False)
+    _worker_engine = create_engine(DATABASE_URL, pool_size=1)
+
+def run_task(task, tab_id, source, batch_size=DEFAULT_BATCH_SIZE):
+    """Upsert one task's rows in batches, returning (task, row count)"""
+    tab_name, chunk_start, chunk_end = task
+    stmt = upsert_statement(_worker_engine.dialect.name)
+
+    count = 0
+    batch = []
+    # One transaction per task: a crashed task leaves nothing behind and is simply redone
+    with _worker_engine.begin() as conn:
+        for row in source(tab_name, tab_id, chunk_start, chunk_end):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                conn.execute(stmt, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            conn.execute(stmt, batch)
+            count += len(batch)
+    return task, count
+
+def backfill(source, start_date, end_date, tab_names=None, workers=None, checkpoint=DEFAULT_CHECKPOINT,
+             batch_size=DEFAULT_BATCH_SIZE):
+    """Backfill company data for [start_date, end_date) from source across a process pool
+
+    A failed task is reported and left out of the checkpoint, so the next run retries it.
+    Returns (rows upserted, {task key: error} for failed tasks). Raises ValueError if
+    checkpoint holds progress of a different source.
+    """
+    identity = source_identity(source)
+    recorded, completed = load_checkpoint(checkpoint)
+    if completed and recorded != identity:
+        raise ValueError(f"Checkpoint {checkpoint} records progress for {recorded or 'an unknown source'}, "
+                         f"not {identity}; use --restart to discard it")
+
+    db = SessionLocal()
+    try:
+        tab_ids = {name: tab_id for tab_id, name in db.query(Tab.id, Tab.name)}
+        # Partitions are created up front so workers never race on DDL
+        ensure_partitions(db, start_date, end_date)
+        premake_partitions(db)
+    finally:
+        db.close()
+
+    tab_names = tab_names or list(tab_ids)
+    missing = [name for name in tab_names if name not in tab_ids]
+    if missing:
+        raise ValueError(f"Unknown tabs: {', '.join(missing)}")
+
+    tasks = [task for task in plan_tasks(tab_names, start_date, end_date) if task_key(task) not in completed]
+    total = len(tasks)
+    print(f"{total} tasks to run, {len(completed)} already completed")
+    if not tasks:
+        return 0, {}
+
+    done = 0
+    rows = 0
+    failed = {}
+    started = time.monotonic()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        futures = {pool.submit(run_task, task, tab_ids[task[0]], source, batch_size): task for task in tasks}
+        for future in as_completed(futures):
+            task = futures[future]
+            done += 1
+            try:
+                _, count = future.result()
+            except Exception as e:
+                failed[task_key(task)] = str(e)
+                save_checkpoint(checkpoint, identity, completed, failed)
+                print(f"[{done}/{total}] {task_key(task)} failed: {str(e)}")
+                continue
+            completed.add(task_key(task))
+            save_checkpoint(checkpoint, identity, completed, failed)
+
+            rows += count
+            elapsed = time.monotonic() - started
+            print(f"[{done}/{total}] {task_key(task)}: {count} rows "
+                  f"({rows / elapsed if elapsed else 0:,.0f} rows/s overall)")
+
+    if rows:
+        # Backfilled points are usually older than the metrics' cursors, so those metrics are recomputed
+        points = update_metric_stats(changed_since=start_date)
+        print(f"Folded {points} points into metric statistics")
+    return rows, failed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backfill company data in parallel")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--csv", help="CSV file to load; a {tab} placeholder selects one file per tab")
+    source.add_argument("--synthetic", action="store_true",
+                        help="Write generated sample data instead of real rows")
+    parser.add_argument("--start", required=True, type=datetime.fromisoformat)
+    parser.add_argument("--end", required=True, type=datetime.fromisoformat, help="Exclusive end date")
+    parser.add_argument("--tabs", nargs="+", help="Tab names to backfill (default: all)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT,
+                        help="File recording finished tasks so an interrupted run can resume")
+    parser.add_argument("--restart", action="store_true", help="Ignore and reset the checkpoint")
+    args = parser.parse_args(argv)
+
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    source = CsvSource(args.csv) if args.csv else generate_rows
+    rows, failed = backfill(source, args.start, args.end, args.tabs, args.workers, args.checkpoint, args.batch_size)
+    print(f"Backfill finished, {rows} rows upserted")
+    if failed:
+        raise SystemExit(f"{len(failed)} tasks failed; rerun to retry them (details in {args.checkpoint})")
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,29 @@
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
-from .models import CompanyData, User, Tab, TabType, get_db
+from .models import CompanyData, Tab, TabType, get_db
+from .partitioning import clear_company_data, ensure_partitions, premake_partitions
+from .access_index import access_index
 import random
 
+# Sample metrics per tab as (metric name, low, high, integer valued)
+SAMPLE_METRICS = {
+    TabType.OVERVIEW: [("Total Revenue", 50000, 100000, False), ("Active Orders", 100, 500, True)],
+    TabType.SALES: [("Daily Sales", 5000, 15000, False), ("Orders Count", 50, 200, True)],
+    TabType.GROSS_PROFIT: [("Gross Profit", 20000, 40000, False), ("Profit Margin", 0.2, 0.4, False)],
+    TabType.INVENTORY: [("Stock Level", 1000, 5000, True), ("Low Stock Items", 5, 50, True)],
+    TabType.SHIPMENT: [("Packages Shipped", 50, 200, True), ("Average Delivery Time", 1, 5, False)],
+}
+
+def sample_value(low, high, integer, rng=random):
+    """Draw one sample metric value"""
+    return rng.randint(low, high) if integer else rng.uniform(low, high)
+
 def generate_sample_company_data():
     """Generate sample data for company dashboard"""
     db = next(get_db())
 
     # Clear existing data
-    db.query(CompanyData).delete()
+    clear_company_data(db)
 
     # Get all tabs
     tabs = {tab.name: tab for tab in db.query(Tab).all()}
@@ -17,120 +32,55 @@ def generate_sample_company_data():
     end_date = datetime.utcnow()
     start_date = end_date - timedelta(days=30)
 
-    sample_data = []
+    # Make sure the monthly partitions for the range, and the next few months, exist
+    ensure_partitions(db, start_date, end_date)
+    premake_partitions(db)
 
-    # Overview metrics
-    for date in (start_date + timedelta(days=x) for x in range(31)):
-        sample_data.extend([
-            CompanyData(
-                date=date,
-                tab_id=tabs[TabType.OVERVIEW.value].id,
-                metric_name="Total Revenue",
-                value=random.uniform(50000, 100000)
-            ),
-            CompanyData(
-                date=date,
-                tab_id=tabs[TabType.OVERVIEW.value].id,
-                metric_name="Active Orders",
-                value=random.randint(100, 500)
-            )
-        ])
-
-    # Sales metrics
-    for date in (start_date + timedelta(days=x) for x in range(31)):
-        sample_data.extend([
-            CompanyData(
-                date=date,
-                tab_id=tabs[TabType.SALES.value].id,
-                metric_name="Daily Sales",
-                value=random.uniform(5000, 15000)
-            ),
-            CompanyData(
-                date=date,
-                tab_id=tabs[TabType.SALES.value].id,
-                metric_name="Orders Count",
-                value=random.randint(50, 200)
-            )
-        ])
-
-    # Gross Profit metrics
-    for date in (start_date + timedelta(days=x) for x in range(31)):
-        sample_data.extend([
-            CompanyData(
-                date=date,
-                tab_id=tabs[TabType.GROSS_PROFIT.value].id,
-                metric_name="Gross Profit",
-                value=random.uniform(20000, 40000)
-            ),
-            CompanyData(
-                date=date,
-                tab_id=tabs[TabType.GROSS_PROFIT.value].id,
-                metric_name="Profit Margin",
-                value=random.uniform(0.2, 0.4)
-            )
-        ])
-
-    # Inventory metrics
-    for date in (start_date + timedelta(days=x) for x in range(31)):
-        sample_data.extend([
-            CompanyData(
-                date=date,
-                tab_id=tabs[TabType.INVENTORY.value].id,
-                metric_name="Stock Level",
-                value=random.randint(1000, 5000)
-            ),
-            CompanyData(
-                date=date,
-                tab_id=tabs[TabType.INVENTORY.value].id,
-                metric_name="Low Stock Items",
-                value=random.randint(5, 50)
-            )
-        ])
-
-    # Shipment metrics
-    for date in (start_date + timedelta(days=x) for x in range(31)):
-        sample_data.extend([
-            CompanyData(
-                date=date,
-                tab_id=tabs[TabType.SHIPMENT.value].id,
-                metric_name="Packages Shipped",
-                value=random.randint(50, 200)
-            ),
-            CompanyData(
-                date=date,
-                tab_id=tabs[TabType.SHIPMENT.value].id,
-                metric_name="Average Delivery Time",
-                value=random.uniform(1, 5)
-            )
-        ])
+    sample_data = []
+    for tab_type, metrics in SAMPLE_METRICS.items():
+        for date in (start_date + timedelta(days=x) for x in range(31)):
+            for metric_name, low, high, integer in metrics:
+                sample_data.append(CompanyData(
+                    date=date,
+                    tab_id=tabs[tab_type.value].id,
+                    metric_name=metric_name,
+                    value=sample_value(low, high, integer)
+                ))
 
     # Add all sample data
     db.bulk_save_objects(sample_data)
     db.commit()
 
-def get_tab_data(username: str, tab_name: str):
-    """Get data for a specific dashboard tab"""
-    db = next(get_db())
-
-    # Get user and tab
-    user = db.query(User).filter(User.username == username).first()
-    tab = db.query(Tab).filter(Tab.name == tab_name).first()
-
-    if not user:
+def check_tab_access(db: Session, username: str, tab_name: str):
+    """Resolve a tab the user is allowed to read, returning (tab, message)"""
+    # User and tab are resolved from the in-memory access index
+    if access_index.user_id(username) is None:
         return None, "User not found"
 
-    if not tab:
+    tab_id = access_index.tab_id(tab_name)
+    if tab_id is None:
         return None, "Tab not found"
 
     # Super admin can access all tabs
-    if user.role_name != "super_admin":
-        # Check if user has access to this tab
-        if tab not in user.accessible_tabs:
-            return None, "No access to this tab"
-
-    # Get data for the tab
-    data = db.query(CompanyData).filter(
-        CompanyData.tab_id == tab.id
-    ).order_by(CompanyData.date.desc()).all()
+    if not access_index.can_access_tab(username, tab_name):
+        return None, "No access to this tab"
+
+    return db.get(Tab, tab_id), "Success"
+
+def get_tab_data(username: str, tab_name: str, start_date: datetime = None, end_date: datetime = None):
+    """Get data for a specific dashboard tab, optionally limited to [start_date, end_date)"""
+    db = next(get_db())
+
+    tab, message = check_tab_access(db, username, tab_name)
+    if not tab:
+        return None, message
+
+    # Get data for the tab; a date range lets Postgres prune untouched partitions
+    query = db.query(CompanyData).filter(CompanyData.tab_id == tab.id)
+    if start_date:
+        query = query.filter(CompanyData.date >= start_date)
+    if end_date:
+        query = query.filter(CompanyData.date < end_date)
+    data = query.order_by(CompanyData.date.desc()).all()
 
     return data, "Success"
\ No newline at end of file
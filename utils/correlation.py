@@ -0,0 +1,176 @@
+import os
+import threading
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from .models import CompanyData, SessionLocal
+from .company_data import check_tab_access
+from .archive import hot_row_conditions, merge_rows, read_archived
+
+CORRELATION_CACHE_TTL = float(os.getenv('CORRELATION_CACHE_TTL', '300'))
+CORRELATION_CACHE_SIZE = int(os.getenv('CORRELATION_CACHE_SIZE', '128'))
+DEFAULT_MAX_LAG = 7
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+def clear_correlation_cache():
+    """Drop all cached alignment results"""
+    with _cache_lock:
+        _cache.clear()
+
+def _cache_get(key):
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        _cache.pop(key, None)
+        return None
+
+def _cache_put(key, value):
+    now = time.monotonic()
+    with _cache_lock:
+        for stale in [k for k, (expiry, _) in _cache.items() if expiry <= now]:
+            del _cache[stale]
+        if len(_cache) >= CORRELATION_CACHE_SIZE:
+            # Evict the entry closest to expiry
+            del _cache[min(_cache, key=lambda k: _cache[k][0])]
+        _cache[key] = (now + CORRELATION_CACHE_TTL, value)
+
+def _load_metric_rows(db, tab, metric_names, start_date, end_date):
+    """Rows of the given metrics of one tab, from both the archive and the hot table"""
+    cold = read_archived(tab.name, start_date, end_date)
+    if cold.num_rows:
+        cold = cold.to_pandas()
+        cold = cold.loc[cold['metric_name'].isin(metric_names), ['date', 'metric_name', 'value']]
+    else:
+        cold = None
+
+    hot = db.query(
+        CompanyData.date, CompanyData.metric_name, CompanyData.value
+    ).filter(
+        *hot_row_conditions(tab.id, start_date, end_date),
+        CompanyData.metric_name.in_(metric_names)
+    ).all()
+    hot = pd.DataFrame(hot, columns=['date', 'metric_name', 'value']) if hot else None
+
+    df = merge_rows(cold, hot)
+    df['metric_name'] = tab.name + ":" + df['metric_name']
+    return df
+
+def align_metrics(db, tabs, metrics, start_date, end_date):
+    """Align (tab, metric) series on a daily index, returning (dates, matrix) with NaN gaps"""
+    labels = [f"{tab_name}:{metric_name}" for tab_name, metric_name in metrics]
+
+    frames = []
+    for tab_name, tab in tabs.items():
+        metric_names = [metric_name for name, metric_name in metrics if name == tab_name]
+        frames.append(_load_metric_rows(db, tab, metric_names, start_date, end_date))
+    df = pd.concat(frames, ignore_index=True)
+
+    # Days in [start_date, end_date), matching the row filters
+    dates = pd.date_range(pd.Timestamp(start_date).floor('D'), pd.Timestamp(end_date), freq='D', inclusive='left')
+    if df.empty:
+        return dates.to_numpy(), np.full((len(dates), len(labels)), np.nan)
+
+    df['date'] = pd.to_datetime(df['date']).dt.floor('D')
+    aligned = df.pivot_table(index='date', columns='metric_name', values='value', aggfunc='mean')
+    aligned = aligned.reindex(index=dates, columns=labels)
+    return dates.to_numpy(), aligned.to_numpy(dtype=float)
+
+def _pearson(x, y):
+    """Pearson correlation over positions where both series have values"""
+    mask = np.isfinite(x) & np.isfinite(y)
+    if mask.sum() < 3:
+        return np.nan
+    x, y = x[mask], y[mask]
+    x = x - x.mean()
+    y = y - y.mean()
+    denom = np.sqrt((x * x).sum() * (y * y).sum())
+    return float((x * y).sum() / denom) if denom else np.nan
+
+def _lag_correlation(x, y, max_lag):
+    """Correlation of x(t) with y(t + lag) for lag in [-max_lag, max_lag]"""
+    lags = np.arange(-max_lag, max_lag + 1)
+    r = np.empty(len(lags))
+    n = len(x)
+    for i, lag in enumerate(lags):
+        if abs(lag) >= n:
+            r[i] = np.nan
+        elif lag >= 0:
+            r[i] = _pearson(x[:n - lag], y[lag:])
+        else:
+            r[i] = _pearson(x[-lag:], y[:n + lag])
+    best = int(lags[np.nanargmax(np.abs(r))]) if np.isfinite(r).any() else None
+    return {'lags': lags, 'r': r, 'best_lag': best}
+
+def _compute(db, tabs, metrics, start_date, end_date, max_lag):
+    dates, values = align_metrics(db, tabs, metrics, start_date, end_date)
+    labels = [f"{tab_name}:{metric_name}" for tab_name, metric_name in metrics]
+    k = len(labels)
+
+    correlation = np.full((k, k), np.nan)
+    lag_correlation = {}
+    ratios = {}
+    for i in range(k):
+        correlation[i, i] = 1.0
+        for j in range(i + 1, k):
+            x, y = values[:, i], values[:, j]
+            correlation[i, j] = correlation[j, i] = _pearson(x, y)
+            lag_correlation[(labels[i], labels[j])] = _lag_correlation(x, y, max_lag)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ratio = np.where(x != 0, y / x, np.nan)
+            # Ratios are keyed (numerator, denominator)
+            ratios[(labels[j], labels[i])] = ratio
+
+    # Results are shared through the cache, so callers must not modify them in place
+    for array in [dates, values, correlation, *ratios.values()]:
+        array.setflags(write=False)
+    for lagged in lag_correlation.values():
+        lagged['lags'].setflags(write=False)
+        lagged['r'].setflags(write=False)
+
+    return {
+        'dates': dates,
+        'metrics': labels,
+        'values': values,
+        'correlation': correlation,
+        'lag_correlation': lag_correlation,
+        'ratios': ratios,
+    }
+
+def correlate_metrics(username: str, metrics: list, start_date: datetime, end_date: datetime,
+                      max_lag: int = DEFAULT_MAX_LAG):
+    """Correlation, lag correlation and ratios for (tab_name, metric_name) pairs the user can read
+
+    Metrics on tabs the user cannot access are left out. Returns (result, message).
+    """
+    db = SessionLocal()
+    try:
+        tabs = {}
+        denied = set()
+        for tab_name, _ in metrics:
+            if tab_name in tabs or tab_name in denied:
+                continue
+            tab, _ = check_tab_access(db, username, tab_name)
+            if tab:
+                tabs[tab_name] = tab
+            else:
+                denied.add(tab_name)
+
+        allowed = tuple(dict.fromkeys((t, m) for t, m in metrics if t in tabs))
+        if not allowed:
+            return None, "No access to the requested metrics"
+
+        key = (allowed, start_date, end_date, max_lag)
+        result = _cache_get(key)
+        if result is None:
+            result = _compute(db, tabs, allowed, start_date, end_date, max_lag)
+            _cache_put(key, result)
+
+        if denied:
+            return result, f"Excluded tabs without access: {', '.join(sorted(denied))}"
+        return result, "Success"
+    finally:
+        db.close()
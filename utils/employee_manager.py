@@ -2,6 +2,8 @@ from datetime import datetime
 from sqlalchemy.orm import Session
 from .models import Employee, User, get_db
 from .auth import has_permission, Permission
+from .activity import log_activity
+from .access_index import access_index, bump_access_version
 
 def create_employee(creator_username: str, employee_data: dict):
     """Create new employee record"""
@@ -21,7 +23,13 @@ def create_employee(creator_username: str, employee_data: dict):
     
     try:
         db.add(new_employee)
+        # Flush for the id so the index can be updated without reloading the row after commit
+        db.flush()
+        employee_id = new_employee.id
+        version = bump_access_version(db)
         db.commit()
+        access_index.add_employee(employee_id, bool(employee_data.get('is_shared', False)), version=version)
+        log_activity(creator_username, "create_employee", target=employee_data['email'], department=employee_data['department'])
         return True, "Employee created successfully"
     except Exception as e:
         db.rollback()
@@ -30,20 +38,14 @@ def create_employee(creator_username: str, employee_data: dict):
 def get_accessible_employees(username: str):
     """Get employees accessible to the user"""
     db = next(get_db())
-    user = db.query(User).filter(User.username == username).first()
-    
-    if not user:
-        return []
-    
-    # Super admin can see all employees
-    if user.role == "super_admin":
+
+    # Super admin can see all employees, others see shared and explicitly shared-with-them ones
+    employee_ids = access_index.visible_employee_ids(username)
+    if employee_ids is None:
         return db.query(Employee).all()
-    
-    # Others can see shared employees and their accessible employees
-    return db.query(Employee).filter(
-        (Employee.is_shared == True) | 
-        (Employee.id.in_([emp.id for emp in user.accessible_employees]))
-    ).all()
+    if not employee_ids:
+        return []
+    return db.query(Employee).filter(Employee.id.in_(employee_ids)).all()
 
 def share_employee(username: str, employee_id: int, target_username: str):
     """Share employee data with another user"""
@@ -59,7 +61,11 @@ def share_employee(username: str, employee_id: int, target_username: str):
 
     try:
         target_user.accessible_employees.append(employee)
+        target_user_id = target_user.id
+        version = bump_access_version(db)
         db.commit()
+        access_index.grant_employee(target_user_id, employee_id, version=version)
+        log_activity(username, "share_employee", target=target_username, employee_id=employee_id)
         return True, f"Employee shared with {target_username}"
     except Exception:
         db.rollback()
@@ -0,0 +1,279 @@
+import argparse
+import atexit
+import csv
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from sqlalchemy import select
+from .models import CompanyData, SessionLocal
+from .company_data import check_tab_access
+from .archive import (
+    ARROW_SCHEMA, archived_months, hot_row_conditions, merge_rows,
+    outside_archive_conditions, read_archive_file
+)
+from .partitioning import add_months
+
+EXPORT_FORMATS = {'csv': '.csv', 'parquet': '.parquet'}
+EXPORT_COLUMNS = [field.name for field in ARROW_SCHEMA]
+DEFAULT_CHUNK_SIZE = 10000
+
+# Exports offered in the app are spooled under static/ next to app.py, which Streamlit serves
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXPORT_DIR = os.path.join(APP_DIR, 'static', 'exports')
+EXPORT_TTL_SECONDS = int(os.getenv('EXPORT_TTL_SECONDS', '3600'))
+# Streamlit refuses static files over 200 MB, so spooled exports are split into parts below that
+EXPORT_PART_BYTES = int(os.getenv('EXPORT_PART_BYTES', str(190 * 1024 * 1024)))
+# Spooled exports run on background threads so large ones never block the app script
+EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', '2'))
+
+def iter_tab_batches(db, tab, start_date=None, end_date=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield Arrow record batches of a tab's rows, archived months first, oldest first"""
+    months = archived_months(tab.name)
+    for month, path in months.items():
+        if start_date and add_months(month, 1) <= start_date:
+            continue
+        if end_date and month >= end_date:
+            continue
+        lower = max(month, start_date) if start_date else month
+        upper = min(add_months(month, 1), end_date) if end_date else add_months(month, 1)
+
+        # One archive file at a time keeps only a month of cold data mapped
+        table = read_archive_file(path)
+        table = table.filter(pc.and_(
+            pc.greater_equal(table['date'], pa.scalar(lower, pa.timestamp('us'))),
+            pc.less(table['date'], pa.scalar(upper, pa.timestamp('us')))
+        ))
+
+        # Hot rows written into an archived month override the archive
+        hot = db.query(
+            CompanyData.date, CompanyData.metric_name, CompanyData.value, CompanyData.notes
+        ).filter(*hot_row_conditions(tab.id, lower, upper)).all()
+        if hot:
+            merged = merge_rows(table.to_pandas(), pd.DataFrame(hot, columns=EXPORT_COLUMNS))
+            table = pa.Table.from_pandas(merged.sort_values('date'), schema=ARROW_SCHEMA, preserve_index=False)
+        yield from table.to_batches(max_chunksize=chunk_size)
+
+    # Remaining hot rows come through a server-side cursor, chunk_size rows at a time
+    stmt = select(
+        CompanyData.date, CompanyData.metric_name, CompanyData.value, CompanyData.notes
+    ).where(
+        *hot_row_conditions(tab.id, start_date, end_date),
+        *outside_archive_conditions(months)
+    ).order_by(CompanyData.date).execution_options(stream_results=True, yield_per=chunk_size)
+
+    result = db.execute(stmt)
+    for rows in result.partitions():
+        yield pa.RecordBatch.from_pydict({
+            'date': [row.date for row in rows],
+            'metric_name': [row.metric_name for row in rows],
+            'value': [row.value for row in rows],
+            'notes': [row.notes for row in rows],
+        }, schema=ARROW_SCHEMA)
+
+def _write_csv(batches, part_path, max_bytes=None):
+    """Write CSV parts of at most about max_bytes each (a single file if None)
+
+    Only the first part has a header, so concatenating the parts in order gives one valid CSV.
+    """
+    count, paths = 0, []
+    f = writer = None
+    try:
+        for batch in batches:
+            if f is None or (max_bytes and f.tell() >= max_bytes):
+                if f is not None:
+                    f.close()
+                paths.append(part_path(len(paths)))
+                f = open(paths[-1], 'w', newline='')
+                writer = csv.writer(f)
+                if len(paths) == 1:
+                    writer.writerow(EXPORT_COLUMNS)
+            columns = batch.to_pydict()
+            writer.writerows(zip(*(columns[name] for name in EXPORT_COLUMNS)))
+            count += batch.num_rows
+        if f is None:
+            paths.append(part_path(0))
+            f = open(paths[-1], 'w', newline='')
+            csv.writer(f).writerow(EXPORT_COLUMNS)
+    finally:
+        if f is not None:
+            f.close()
+    return count, paths
+
+def _write_parquet(batches, part_path, max_bytes=None):
+    """Write Parquet parts of at most about max_bytes each (a single file if None)"""
+    count, paths = 0, []
+    sink = writer = None
+
+    def close_part():
+        if writer is not None:
+            writer.close()
+        if sink is not None:
+            sink.close()
+
+    try:
+        for batch in batches:
+            if writer is None or (max_bytes and sink.tell() >= max_bytes):
+                close_part()
+                paths.append(part_path(len(paths)))
+                sink = pa.OSFile(paths[-1], 'wb')
+                writer = pq.ParquetWriter(sink, ARROW_SCHEMA)
+            writer.write_batch(batch)
+            count += batch.num_rows
+        if writer is None:
+            paths.append(part_path(0))
+            sink = pa.OSFile(paths[-1], 'wb')
+            writer = pq.ParquetWriter(sink, ARROW_SCHEMA)
+    finally:
+        close_part()
+    return count, paths
+
+def _export(username, tab_name, part_path, fmt, start_date=None, end_date=None,
+            chunk_size=DEFAULT_CHUNK_SIZE, max_bytes=None):
+    """Stream a tab's data to one or more files, returning (row count, paths, message)"""
+    if fmt not in EXPORT_FORMATS:
+        return None, [], f"Unsupported export format: {fmt}"
+
+    written = []
+    def tracked_path(index):
+        written.append(part_path(index))
+        return written[-1]
+
+    db = SessionLocal()
+    try:
+        tab, message = check_tab_access(db, username, tab_name)
+        if not tab:
+            return None, [], message
+
+        batches = iter_tab_batches(db, tab, start_date, end_date, chunk_size)
+        if fmt == 'parquet':
+            count, paths = _write_parquet(batches, tracked_path, max_bytes)
+        else:
+            count, paths = _write_csv(batches, tracked_path, max_bytes)
+        return count, paths, "Success"
+    except Exception as e:
+        print(f"Export error: {str(e)}")
+        # Never leave partial files behind, they may be publicly served
+        for path in written:
+            if os.path.exists(path):
+                os.remove(path)
+        return None, [], f"Failed to export tab data: {str(e)}"
+    finally:
+        db.close()
+
+def export_tab_data(username: str, tab_name: str, output: str, fmt: str = 'csv',
+                    start_date: datetime = None, end_date: datetime = None,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """Stream a tab's data to a CSV or Parquet file in chunks"""
+    count, _, message = _export(username, tab_name, lambda index: output, fmt, start_date, end_date, chunk_size)
+    if count is None:
+        return False, message
+    return True, f"Exported {count} rows to {output}"
+
+def cleanup_exports():
+    """Remove spooled exports older than EXPORT_TTL_SECONDS"""
+    if not os.path.isdir(EXPORT_DIR):
+        return
+    expiry = time.time() - EXPORT_TTL_SECONDS
+    for filename in os.listdir(EXPORT_DIR):
+        path = os.path.join(EXPORT_DIR, filename)
+        if os.path.getmtime(path) < expiry:
+            os.remove(path)
+
+def spool_tab_export(username: str, tab_name: str, fmt: str = 'csv', chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """Export a tab into the static export directory in parts, returning (filenames, row count, message)"""
+    cleanup_exports()
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+
+    # Unguessable names: files under static/ are served without a session check
+    token = uuid.uuid4().hex
+    ext = EXPORT_FORMATS.get(fmt, '')
+    count, paths, message = _export(
+        username, tab_name,
+        lambda index: os.path.join(EXPORT_DIR, f"{token}-{index + 1:03d}{ext}"),
+        fmt, chunk_size=chunk_size, max_bytes=EXPORT_PART_BYTES
+    )
+    return [os.path.basename(path) for path in paths], count, message
+
+class ExportJobs:
+    """Runs spool_tab_export on a small thread pool and keeps each job's status for polling"""
+
+    def __init__(self, workers=EXPORT_WORKERS):
+        self.workers = workers
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def submit(self, username, tab_name, fmt='csv'):
+        """Start an export in the background, returning its job id"""
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._prune()
+            self._jobs[job_id] = {
+                'username': username, 'tab_name': tab_name, 'fmt': fmt, 'state': 'running',
+                'filenames': [], 'count': None, 'message': "Export in progress", 'updated_at': time.time(),
+            }
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="export")
+            self._executor.submit(self._run, job_id, username, tab_name, fmt)
+        return job_id
+
+    def status(self, job_id, username):
+        """Copy of a job's status, or None if there is no such job for this user"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['username'] != username:
+                return None
+            return dict(job)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job_id, username, tab_name, fmt):
+        try:
+            filenames, count, message = spool_tab_export(username, tab_name, fmt)
+        except Exception as e:
+            filenames, count, message = [], None, f"Failed to export tab data: {str(e)}"
+        with self._lock:
+            self._jobs[job_id].update(
+                state='done' if count is not None else 'failed',
+                filenames=filenames, count=count, message=message, updated_at=time.time()
+            )
+
+    def _prune(self):
+        # Finished jobs are forgotten once cleanup_exports would have removed their files
+        expiry = time.time() - EXPORT_TTL_SECONDS
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job['state'] != 'running' and job['updated_at'] < expiry]:
+            del self._jobs[job_id]
+
+export_jobs = ExportJobs()
+atexit.register(export_jobs.close)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export dashboard tab data")
+    parser.add_argument("--user", required=True, help="Username whose tab access is checked")
+    parser.add_argument("--tab", required=True, help="Tab name, e.g. sales")
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="csv")
+    parser.add_argument("--start", type=datetime.fromisoformat)
+    parser.add_argument("--end", type=datetime.fromisoformat)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    success, message = export_tab_data(
+        args.user, args.tab, args.output, args.format,
+        start_date=args.start, end_date=args.end, chunk_size=args.chunk_size
+    )
+    print(message)
+    raise SystemExit(0 if success else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import atexit
+import os
+import threading
+from sqlalchemy import bindparam, update
+from .models import User, engine
+
+# Flush every LOGIN_FLUSH_INTERVAL seconds, or sooner once this many users are pending
+LOGIN_FLUSH_INTERVAL = float(os.getenv('LOGIN_FLUSH_INTERVAL', '5'))
+LOGIN_FLUSH_THRESHOLD = int(os.getenv('LOGIN_FLUSH_THRESHOLD', '500'))
+
+users_table = User.__table__
+
+class LoginWriteBuffer:
+    """Collects last_login timestamps in memory and writes them in batched UPDATEs"""
+
+    def __init__(self, interval=LOGIN_FLUSH_INTERVAL, threshold=LOGIN_FLUSH_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def record(self, user_id, timestamp):
+        """Queue a login timestamp; only the newest one per user is written"""
+        with self._lock:
+            current = self._pending.get(user_id)
+            if current is None or timestamp > current:
+                self._pending[user_id] = timestamp
+            pending = len(self._pending)
+            if self._thread is None and not self._stopped.is_set():
+                self._thread = threading.Thread(target=self._run, name="login-write-buffer", daemon=True)
+                self._thread.start()
+
+        if pending >= self.threshold:
+            self._wake.set()
+
+    def pending(self, user_id):
+        """Timestamp recorded for a user that has not been written yet"""
+        with self._lock:
+            return self._pending.get(user_id)
+
+    def flush(self):
+        """Write all pending timestamps in one transaction, returning the row count"""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+
+        try:
+            with engine.begin() as conn:
+                conn.execute(
+                    update(users_table)
+                    .where(users_table.c.id == bindparam('b_user_id'))
+                    .values(last_login=bindparam('b_last_login')),
+                    [{'b_user_id': user_id, 'b_last_login': timestamp} for user_id, timestamp in batch.items()]
+                )
+            return len(batch)
+        except Exception as e:
+            print(f"Error flushing login timestamps: {str(e)}")
+            # Put the batch back without clobbering newer logins recorded meanwhile
+            with self._lock:
+                for user_id, timestamp in batch.items():
+                    current = self._pending.get(user_id)
+                    if current is None or timestamp > current:
+                        self._pending[user_id] = timestamp
+            return 0
+
+    def close(self):
+        """Stop the background thread and write whatever is still pending"""
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+login_buffer = LoginWriteBuffer()
+atexit.register(login_buffer.close)
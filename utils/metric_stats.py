@@ -0,0 +1,222 @@
+import argparse
+import atexit
+import json
+import math
+import os
+import threading
+from collections import deque
+from datetime import datetime
+from sqlalchemy import select, text
+from .models import CompanyData, MetricStats, PARTITIONED, Tab, SessionLocal
+
+ROLLING_WINDOW = int(os.getenv('ROLLING_WINDOW', '30'))
+EWMA_ALPHA = float(os.getenv('EWMA_ALPHA', '0.2'))
+ANOMALY_Z = float(os.getenv('ANOMALY_Z', '3.0'))
+# Points needed in the window before a z-score is trusted
+MIN_POINTS = int(os.getenv('ANOMALY_MIN_POINTS', '5'))
+# Seconds between background folds in the app; 0 disables them
+METRIC_STATS_INTERVAL = float(os.getenv('METRIC_STATS_INTERVAL', '300'))
+# Advisory lock key serializing folds across processes on Postgres
+METRIC_STATS_LOCK_KEY = 7204311
+
+# Two folds at once would push the same points twice
+_update_lock = threading.Lock()
+
+class RollingMetric:
+    """Windowed mean/variance (sliding Welford) and EWMA updated in O(1) per point"""
+
+    def __init__(self, row):
+        self.row = row
+        self.window = deque(json.loads(row.window) if row.window else [], maxlen=ROLLING_WINDOW)
+        self.count = row.count or 0
+        self.mean = row.mean or 0.0
+        self.m2 = row.m2 or 0.0
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def push(self, date, value):
+        """Fold one new point into the state"""
+        row = self.row
+
+        # Score the point against the window before it joins it
+        std = math.sqrt(self.variance)
+        if self.count >= MIN_POINTS and std > 0:
+            row.z_score = (value - self.mean) / std
+            row.is_anomaly = abs(row.z_score) >= ANOMALY_Z
+        else:
+            row.z_score = None
+            row.is_anomaly = False
+
+        if len(self.window) == ROLLING_WINDOW:
+            self._remove(self.window[0])
+        self.window.append(value)
+        self._add(value)
+
+        if row.ewma is None:
+            row.ewma, row.ewm_var = value, 0.0
+        else:
+            diff = value - row.ewma
+            increment = EWMA_ALPHA * diff
+            row.ewma += increment
+            row.ewm_var = (1 - EWMA_ALPHA) * (row.ewm_var + diff * increment)
+
+        row.last_date = date
+        row.last_value = value
+
+    def _add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def _remove(self, value):
+        if self.count <= 1:
+            self.count, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+        self.count -= 1
+        delta = value - self.mean
+        self.mean -= delta / self.count
+        self.m2 = max(0.0, self.m2 - delta * (value - self.mean))
+
+    def save(self):
+        self.row.window = json.dumps(list(self.window))
+        self.row.count = self.count
+        self.row.mean = self.mean
+        self.row.m2 = self.m2
+
+def _fold(db, state, tab_id, metric_name, since, batch_size):
+    """Push one metric's points newer than since, oldest first, returning the number folded"""
+    stmt = select(CompanyData.date, CompanyData.value).where(
+        CompanyData.tab_id == tab_id, CompanyData.metric_name == metric_name
+    ).order_by(CompanyData.date).execution_options(stream_results=True, yield_per=batch_size)
+    if since is not None:
+        stmt = stmt.where(CompanyData.date > since)
+
+    points = 0
+    for rows in db.execute(stmt).partitions():
+        for date, value in rows:
+            state.push(date, value)
+            points += 1
+    return points
+
+def update_metric_stats(batch_size=5000, rebuild=False, changed_since=None):
+    """Fold points newer than each metric's persisted state into its rolling statistics
+
+    Each metric resumes from its own last_date. Writers that add points out of order
+    (backfills) pass changed_since, the oldest date they wrote: metrics whose cursor
+    is past it are recomputed from full history and new metrics are looked for from
+    there. rebuild=True recomputes everything.
+    """
+    with _update_lock:
+        return _update_metric_stats(batch_size, rebuild, changed_since)
+
+def _update_metric_stats(batch_size, rebuild, changed_since):
+    db = SessionLocal()
+    try:
+        if PARTITIONED:
+            # Held until commit, so folds in other processes wait instead of double counting
+            db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": METRIC_STATS_LOCK_KEY})
+
+        if rebuild:
+            db.query(MetricStats).delete()
+        elif changed_since is not None:
+            db.query(MetricStats).filter(MetricStats.last_date >= changed_since).delete()
+
+        states = {
+            (row.tab_id, row.metric_name): RollingMetric(row)
+            for row in db.query(MetricStats).all()
+        }
+
+        # New metrics are looked for only among rows from the stalest cursor (or changed_since)
+        # on; with no state at all every metric is new
+        cursors = [state.row.last_date for state in states.values() if state.row.last_date]
+        if changed_since is not None:
+            cursors.append(changed_since)
+        since = min(cursors, default=None) if states else None
+        stmt = select(CompanyData.tab_id, CompanyData.metric_name).distinct()
+        if since is not None:
+            stmt = stmt.where(CompanyData.date >= since)
+        for tab_id, metric_name in db.execute(stmt):
+            if (tab_id, metric_name) not in states:
+                row = MetricStats(tab_id=tab_id, metric_name=metric_name)
+                db.add(row)
+                states[(tab_id, metric_name)] = RollingMetric(row)
+
+        points = 0
+        for (tab_id, metric_name), state in states.items():
+            points += _fold(db, state, tab_id, metric_name, state.row.last_date, batch_size)
+            state.save()
+        db.commit()
+        return points
+    except Exception as e:
+        db.rollback()
+        print(f"Error updating metric statistics: {str(e)}")
+        raise
+    finally:
+        db.close()
+
+def get_metric_flags(tab_name: str):
+    """Rolling statistics and anomaly flag for every metric of a tab, keyed by metric name"""
+    db = SessionLocal()
+    try:
+        rows = db.query(MetricStats).join(Tab, Tab.id == MetricStats.tab_id).filter(Tab.name == tab_name).all()
+        return {
+            row.metric_name: {
+                'mean': row.mean,
+                'std': math.sqrt(row.m2 / (row.count - 1)) if row.count and row.count > 1 else 0.0,
+                'ewma': row.ewma,
+                'ewm_std': math.sqrt(row.ewm_var or 0.0),
+                'z_score': row.z_score,
+                'is_anomaly': bool(row.is_anomaly),
+                'last_date': row.last_date,
+            }
+            for row in rows
+        }
+    finally:
+        db.close()
+
+class MetricStatsRefresher:
+    """Background thread folding new points every interval seconds, so flags follow ingestion"""
+
+    def __init__(self, interval=METRIC_STATS_INTERVAL):
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None or self.interval <= 0:
+                return
+            self._thread = threading.Thread(target=self._run, name="metric-stats-refresher", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                update_metric_stats()
+            except Exception:
+                # Already logged; try again next interval
+                pass
+
+metric_stats_refresher = MetricStatsRefresher()
+atexit.register(metric_stats_refresher.close)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Update rolling metric statistics")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute every metric from full history")
+    parser.add_argument("--changed-since", type=datetime.fromisoformat,
+                        help="Oldest date of points written out of order, e.g. by a backfill")
+    args = parser.parse_args(argv)
+    points = update_metric_stats(rebuild=args.rebuild, changed_since=args.changed_since)
+    print(f"Folded {points} new points into metric statistics")
+
+if __name__ == "__main__":
+    main()
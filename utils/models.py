@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean, Enum, ForeignKey, Table
+from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean, Enum, ForeignKey, Table, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 import os
@@ -14,6 +14,10 @@ if not DATABASE_URL:
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# company_data is range partitioned by month on Postgres; other backends
+# (SQLite) fall back to a single table
+PARTITIONED = engine.dialect.name == "postgresql"
+
 Base = declarative_base()
 
 class UserRole(enum.Enum):
@@ -94,14 +98,54 @@ class Employee(Base):
 
 class CompanyData(Base):
     __tablename__ = "company_data"
-    id = Column(Integer, primary_key=True, index=True)
-    date = Column(DateTime, index=True)
+    # Postgres requires the partition key in the primary key of a partitioned table
+    __table_args__ = (
+        Index('ix_company_data_tab_date', 'tab_id', 'date'),
+        # Natural key for idempotent upserts; includes the partition key as Postgres requires
+        UniqueConstraint('tab_id', 'metric_name', 'date', name='uq_company_data_tab_metric_date'),
+        {'postgresql_partition_by': 'RANGE (date)'} if PARTITIONED else {},
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    date = Column(DateTime, primary_key=PARTITIONED, nullable=False, index=True)
     tab_id = Column(Integer, ForeignKey('tabs.id', ondelete='CASCADE'))
     metric_name = Column(String)
     value = Column(Float)
     notes = Column(String, nullable=True)
     tab = relationship("Tab", back_populates="data")
 
+class MetricStats(Base):
+    __tablename__ = "metric_stats"
+    tab_id = Column(Integer, ForeignKey('tabs.id', ondelete='CASCADE'), primary_key=True)
+    metric_name = Column(String, primary_key=True)
+    last_date = Column(DateTime)
+    last_value = Column(Float)
+    count = Column(Integer, default=0)
+    mean = Column(Float, default=0.0)
+    m2 = Column(Float, default=0.0)
+    ewma = Column(Float)
+    ewm_var = Column(Float, default=0.0)
+    window = Column(String)
+    z_score = Column(Float)
+    is_anomaly = Column(Boolean, default=False)
+
+# Single row bumped with every access change so each process's access index knows to rebuild
+class AccessVersion(Base):
+    __tablename__ = "access_version"
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class ActivityEvent(Base):
+    __tablename__ = "activity_events"
+    __table_args__ = (
+        Index('ix_activity_events_user_time', 'username', 'created_at'),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    created_at = Column(DateTime, nullable=False, index=True)
+    username = Column(String)
+    action = Column(String, nullable=False)
+    target = Column(String, nullable=True)
+    details = Column(String, nullable=True)
+
 def get_db():
     db = SessionLocal()
     try:
@@ -156,6 +200,10 @@ def init_db():
         Base.metadata.drop_all(bind=engine)
         print("Dropped existing tables")
 
+        # Archive files belong to the dropped data
+        from .archive import clear_archive
+        clear_archive()
+
         # Create all tables
         Base.metadata.create_all(bind=engine)
         print("Created database tables")
@@ -163,6 +211,8 @@ def init_db():
         # Initialize roles and tabs
         initialize_roles(db)
         initialize_tabs(db)
+        db.add(AccessVersion(id=1, version=0))
+        db.commit()
 
         print("Database initialization completed successfully")
     except Exception as e:
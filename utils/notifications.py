@@ -0,0 +1,234 @@
+import atexit
+import os
+import queue
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+
+# Recipients for admin alerts, comma separated phone numbers
+ADMIN_NOTIFY_NUMBERS = [n.strip() for n in os.getenv('ADMIN_NOTIFY_NUMBERS', '').split(',') if n.strip()]
+# 'twilio', or 'fake' for local development; with neither, alerts are dropped with a warning
+NOTIFY_BACKEND = os.getenv('NOTIFY_BACKEND', 'twilio' if os.getenv('TWILIO_ACCOUNT_SID') else '')
+NOTIFY_QUEUE_SIZE = int(os.getenv('NOTIFY_QUEUE_SIZE', '1000'))
+NOTIFY_WORKERS = int(os.getenv('NOTIFY_WORKERS', '2'))
+NOTIFY_BATCH_SIZE = int(os.getenv('NOTIFY_BATCH_SIZE', '20'))
+NOTIFY_MAX_RETRIES = int(os.getenv('NOTIFY_MAX_RETRIES', '5'))
+NOTIFY_BACKOFF_BASE = float(os.getenv('NOTIFY_BACKOFF_BASE', '1'))
+NOTIFY_BACKOFF_MAX = float(os.getenv('NOTIFY_BACKOFF_MAX', '60'))
+
+class NotificationBackend(ABC):
+    """Interface for notification providers"""
+
+    @abstractmethod
+    def send_batch(self, messages):
+        """Send (to, body) pairs, returning the pairs that failed and should be retried"""
+
+class TwilioBackend(NotificationBackend):
+    """Sends SMS through Twilio using TWILIO_* environment variables"""
+
+    def __init__(self, account_sid=None, auth_token=None, from_number=None):
+        from twilio.rest import Client
+
+        self.client = Client(
+            account_sid or os.getenv('TWILIO_ACCOUNT_SID'),
+            auth_token or os.getenv('TWILIO_AUTH_TOKEN')
+        )
+        self.from_number = from_number or os.getenv('TWILIO_FROM_NUMBER')
+
+    def send_batch(self, messages):
+        from twilio.base.exceptions import TwilioRestException
+
+        failed = []
+        for to, body in messages:
+            try:
+                self.client.messages.create(to=to, from_=self.from_number, body=body)
+            except TwilioRestException as e:
+                # 4xx other than rate limiting will not succeed on retry
+                if e.status == 429 or e.status >= 500:
+                    failed.append((to, body))
+                else:
+                    print(f"Dropping notification to {to}: {e.msg}")
+            except Exception as e:
+                print(f"Notification to {to} failed: {str(e)}")
+                failed.append((to, body))
+        return failed
+
+class FakeBackend(NotificationBackend):
+    """Keeps the last max_sent messages in memory, for local development and tests"""
+
+    def __init__(self, delay=0, fail_times=0, max_sent=1000):
+        self.delay = delay
+        self.fail_times = fail_times
+        self.sent = deque(maxlen=max_sent)
+        self._lock = threading.Lock()
+
+    def send_batch(self, messages):
+        if self.delay:
+            time.sleep(self.delay)
+        with self._lock:
+            if self.fail_times > 0:
+                self.fail_times -= 1
+                return list(messages)
+            self.sent.extend(messages)
+        return []
+
+def create_backend(name=NOTIFY_BACKEND):
+    """Build the configured notification backend, or None when none is configured"""
+    if not name:
+        return None
+    if name == 'twilio':
+        return TwilioBackend()
+    if name == 'fake':
+        return FakeBackend()
+    raise ValueError(f"Unknown notification backend: {name}")
+
+class NotificationDispatcher:
+    """Bounded queue drained in batches by a pool of worker threads"""
+
+    def __init__(self, backend, workers=NOTIFY_WORKERS, maxsize=NOTIFY_QUEUE_SIZE,
+                 batch_size=NOTIFY_BATCH_SIZE, max_retries=NOTIFY_MAX_RETRIES,
+                 backoff_base=NOTIFY_BACKOFF_BASE, backoff_max=NOTIFY_BACKOFF_MAX):
+        self.backend = backend
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.dropped = 0
+        # Messages accepted but not yet sent or given up on, including those waiting in backoff
+        self._pending = 0
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._threads = []
+
+    def notify(self, to, body):
+        """Queue a message without blocking, returning False if it was dropped"""
+        self._ensure_started()
+        with self._lock:
+            self._pending += 1
+        try:
+            self._queue.put_nowait((to, body, 0))
+            return True
+        except queue.Full:
+            with self._lock:
+                self._pending -= 1
+                self.dropped += 1
+            print(f"Notification queue full, dropped message to {to}")
+            return False
+
+    def close(self, timeout=5):
+        """Stop the workers, giving pending messages up to timeout seconds to go out
+
+        Messages still queued after that, including retries cut short in backoff,
+        get one last synchronous attempt.
+        """
+        deadline = time.monotonic() + timeout
+        while self.pending and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self._stopped.set()
+        # Workers in backoff wake as soon as _stopped is set; give them a moment to re-queue
+        for thread in self._threads:
+            thread.join(max(1, deadline - time.monotonic()))
+        self._flush()
+
+    @property
+    def pending(self):
+        with self._lock:
+            return self._pending
+
+    def _resolve(self, count):
+        with self._lock:
+            self._pending -= count
+
+    def _flush(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if not batch:
+            return
+        try:
+            failed = self.backend.send_batch([(to, body) for to, body, _ in batch])
+        except Exception as e:
+            print(f"Notification backend error: {str(e)}")
+            failed = batch
+        if failed:
+            print(f"Dropping {len(failed)} notifications on shutdown")
+        self._resolve(len(batch))
+
+    def _ensure_started(self):
+        if self._threads or self._stopped.is_set():
+            return
+        with self._lock:
+            if not self._threads:
+                for i in range(self.workers):
+                    thread = threading.Thread(target=self._run, name=f"notify-worker-{i}", daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stopped.is_set():
+            batch = self._next_batch()
+            if not batch:
+                continue
+
+            attempt = max(item[2] for item in batch)
+            try:
+                failed = self.backend.send_batch([(to, body) for to, body, _ in batch])
+            except Exception as e:
+                print(f"Notification backend error: {str(e)}")
+                failed = [(to, body) for to, body, _ in batch]
+            self._resolve(len(batch) - len(failed))
+            if not failed:
+                continue
+
+            if attempt + 1 > self.max_retries:
+                print(f"Giving up on {len(failed)} notifications after {attempt} retries")
+                self._resolve(len(failed))
+                continue
+
+            # Exponential backoff with jitter, holding only this worker
+            delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+            self._stopped.wait(delay * random.uniform(0.5, 1.0))
+            for to, body in failed:
+                try:
+                    self._queue.put_nowait((to, body, attempt + 1))
+                except queue.Full:
+                    self._resolve(1)
+                    print(f"Notification queue full, dropped retry to {to}")
+
+_backend = create_backend()
+dispatcher = NotificationDispatcher(_backend) if _backend else None
+if dispatcher:
+    atexit.register(dispatcher.close)
+_warned_unconfigured = False
+
+def notify_admins(body):
+    """Queue an SMS alert for every ADMIN_NOTIFY_NUMBERS recipient"""
+    global _warned_unconfigured
+    if not ADMIN_NOTIFY_NUMBERS:
+        return
+    if dispatcher is None:
+        if not _warned_unconfigured:
+            _warned_unconfigured = True
+            print("ADMIN_NOTIFY_NUMBERS is set but no NOTIFY_BACKEND is configured; admin alerts are dropped")
+        return
+    for number in ADMIN_NOTIFY_NUMBERS:
+        dispatcher.notify(number, body)
@@ -0,0 +1,215 @@
+import argparse
+import re
+from datetime import datetime
+from sqlalchemy import text
+from .models import CompanyData, PARTITIONED, SessionLocal
+
+PARTITION_PREFIX = "company_data_y"
+PARTITION_PATTERN = re.compile(r"^company_data_y(\d{4})m(\d{2})$")
+DEFAULT_PARTITION = "company_data_default"
+ARCHIVE_SCHEMA = "archive"
+# Months created ahead of time; anything beyond lands in the DEFAULT partition
+PARTITION_PREMAKE_MONTHS = 3
+
+def month_start(date):
+    """Truncate a datetime to the first instant of its month"""
+    return datetime(date.year, date.month, 1)
+
+def add_months(date, months):
+    """Shift a month start by a number of months"""
+    index = date.year * 12 + date.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+def partition_name(date):
+    """Name of the monthly partition holding the given date"""
+    return f"{PARTITION_PREFIX}{date.year:04d}m{date.month:02d}"
+
+def list_partitions(db):
+    """List attached company_data partitions as (name, month_start) sorted by month"""
+    if not PARTITIONED:
+        return []
+
+    rows = db.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :parent"
+    ), {"parent": CompanyData.__tablename__}).all()
+
+    partitions = []
+    for (name,) in rows:
+        match = PARTITION_PATTERN.match(name)
+        if match:
+            partitions.append((name, datetime(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda p: p[1])
+
+def ensure_default_partition(db):
+    """Create the DEFAULT partition that catches rows for months without their own partition"""
+    if not PARTITIONED:
+        return
+    db.execute(text(
+        f'CREATE TABLE IF NOT EXISTS "{DEFAULT_PARTITION}" PARTITION OF {CompanyData.__tablename__} DEFAULT'
+    ))
+    db.commit()
+
+def ensure_partitions(db, start_date, end_date):
+    """Create monthly partitions covering [start_date, end_date] if they do not exist"""
+    if not PARTITIONED:
+        return []
+
+    ensure_default_partition(db)
+    existing = {name for name, _ in list_partitions(db)}
+
+    names = []
+    month = month_start(start_date)
+    while month <= end_date:
+        name = partition_name(month)
+        names.append(name)
+        if name not in existing:
+            _create_partition(db, name, month, add_months(month, 1))
+        month = add_months(month, 1)
+    return names
+
+def _create_partition(db, name, start, end):
+    """Create one month's partition, moving any rows the DEFAULT partition holds for it"""
+    bounds = f"FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    try:
+        # Attaching fails while the default partition holds rows of the range, so move them first
+        db.execute(text(
+            f'CREATE TABLE "{name}" (LIKE {CompanyData.__tablename__} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+        ))
+        db.execute(text(
+            f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" '
+            f"WHERE date >= '{start.isoformat()}' AND date < '{end.isoformat()}' RETURNING *) "
+            f'INSERT INTO "{name}" SELECT * FROM moved'
+        ))
+        db.execute(text(f'ALTER TABLE {CompanyData.__tablename__} ATTACH PARTITION "{name}" FOR VALUES {bounds}'))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+def premake_partitions(db, months=PARTITION_PREMAKE_MONTHS, now=None):
+    """Create partitions for the current month and the next few, ahead of inserts"""
+    current = month_start(now or datetime.utcnow())
+    return ensure_partitions(db, current, add_months(current, months))
+
+def clear_company_data(db):
+    """Remove all company data, truncating partitions instead of deleting rows"""
+    from .archive import clear_archive
+
+    if PARTITIONED:
+        db.execute(text(f"TRUNCATE TABLE {CompanyData.__tablename__}"))
+    else:
+        db.query(CompanyData).delete()
+    db.commit()
+    # Archived months would otherwise reappear next to the new data
+    clear_archive()
+
+def drop_month(db, month, archive=False):
+    """Drop or archive the partition holding one month of company data"""
+    month = month_start(month)
+    if not PARTITIONED:
+        db.query(CompanyData).filter(
+            CompanyData.date >= month,
+            CompanyData.date < add_months(month, 1)
+        ).delete(synchronize_session=False)
+        db.commit()
+        return
+
+    name = partition_name(month)
+    if name not in {existing for existing, _ in list_partitions(db)}:
+        ensure_default_partition(db)
+        in_default = db.execute(text(
+            f'SELECT EXISTS (SELECT 1 FROM "{DEFAULT_PARTITION}" WHERE date >= :start AND date < :end)'
+        ), {"start": month, "end": add_months(month, 1)}).scalar()
+        if not in_default:
+            return
+        # The month's rows sit in DEFAULT; give them a partition so they are dropped or archived like any other
+        _create_partition(db, name, month, add_months(month, 1))
+    db.execute(text(f'ALTER TABLE {CompanyData.__tablename__} DETACH PARTITION "{name}"'))
+    if archive:
+        # Timestamped name so archiving the same month twice never collides in the archive schema
+        archived_name = f"{name}_{datetime.utcnow():%Y%m%d%H%M%S%f}"
+        db.execute(text(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}"))
+        db.execute(text(f'ALTER TABLE "{name}" RENAME TO "{archived_name}"'))
+        # Index (and constraint) names move with the table and would collide in the schema too
+        indexes = db.execute(text(
+            "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = :table"
+        ), {"table": archived_name}).scalars().all()
+        for i, index in enumerate(sorted(indexes)):
+            db.execute(text(f'ALTER INDEX "{index}" RENAME TO "{archived_name}_idx{i}"'))
+        # Archived copies must not pin live tables: drop the id sequence default and foreign keys,
+        # which would otherwise block init_db from dropping company_data and tabs
+        db.execute(text(f'ALTER TABLE "{archived_name}" ALTER COLUMN id DROP DEFAULT'))
+        foreign_keys = db.execute(text(
+            "SELECT conname FROM pg_constraint WHERE contype = 'f' AND conrelid = CAST(:table AS regclass)"
+        ), {"table": f'"{archived_name}"'}).scalars().all()
+        for constraint in foreign_keys:
+            db.execute(text(f'ALTER TABLE "{archived_name}" DROP CONSTRAINT "{constraint}"'))
+        db.execute(text(f'ALTER TABLE "{archived_name}" SET SCHEMA {ARCHIVE_SCHEMA}'))
+    else:
+        db.execute(text(f'DROP TABLE "{name}"'))
+    db.commit()
+
+def apply_retention(db, keep_months, archive=False, now=None):
+    """Drop or archive whole monthly partitions older than keep_months"""
+    cutoff = add_months(month_start(now or datetime.utcnow()), -keep_months)
+
+    if not PARTITIONED:
+        # Single-table fallback: one ranged delete covering every expired month
+        deleted = db.query(CompanyData).filter(
+            CompanyData.date < cutoff
+        ).delete(synchronize_session=False)
+        db.commit()
+        print(f"Deleted {deleted} company data rows older than {cutoff:%Y-%m}")
+        return []
+
+    # Long-running deployments have no restart to premake upcoming months, so do it here
+    premake_partitions(db, now=now)
+
+    # Stray rows in the DEFAULT partition are few; delete the expired ones directly
+    db.execute(text(f'DELETE FROM "{DEFAULT_PARTITION}" WHERE date < :cutoff'), {"cutoff": cutoff})
+    db.commit()
+
+    removed = []
+    for name, month in list_partitions(db):
+        if month >= cutoff:
+            break
+        drop_month(db, month, archive=archive)
+        removed.append(name)
+        print(f"{'Archived' if archive else 'Dropped'} partition {name}")
+    return removed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage company_data partitions")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ensure = subparsers.add_parser("ensure", help="Create partitions for a month range")
+    ensure.add_argument("--start", required=True, type=datetime.fromisoformat)
+    ensure.add_argument("--end", required=True, type=datetime.fromisoformat)
+
+    premake = subparsers.add_parser("premake", help="Create partitions for the coming months")
+    premake.add_argument("--months", type=int, default=PARTITION_PREMAKE_MONTHS)
+
+    retention = subparsers.add_parser("retention", help="Drop or archive expired partitions")
+    retention.add_argument("--keep-months", required=True, type=int)
+    retention.add_argument("--archive", action="store_true",
+                           help=f"Move expired partitions to the '{ARCHIVE_SCHEMA}' schema instead of dropping them")
+
+    args = parser.parse_args(argv)
+    db = SessionLocal()
+    try:
+        if args.command == "ensure":
+            for name in ensure_partitions(db, args.start, args.end):
+                print(f"Partition {name} ready")
+        elif args.command == "premake":
+            for name in premake_partitions(db, args.months):
+                print(f"Partition {name} ready")
+        else:
+            apply_retention(db, args.keep_months, archive=args.archive)
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()